@@ -1,9 +1,17 @@
 """a JupyterLite addon for supporting piplite wheels"""
 
+import compileall
 import datetime
 import json
+import os
+import py_compile
 import re
+import sys
+import tempfile
+import time
 import urllib.parse
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import md5, sha256
 from pathlib import Path
 from typing import Tuple as _Tuple
@@ -17,21 +25,35 @@ from jupyterlite_core.constants import (
     UTF8,
 )
 from jupyterlite_core.trait_types import TypedTuple
-from traitlets import Unicode
+from traitlets import Bool, Int, Unicode
 
 from ._base import _BaseAddon
 
 from ..constants import (
     ALL_WHL,
+    PIPLITE_BOOTSTRAP,
     PIPLITE_INDEX_SCHEMA,
+    PIPLITE_LOCK,
+    PIPLITE_LOCK_URL,
+    PIPLITE_SITE_PACKAGES,
     PIPLITE_URLS,
     PKG_JSON_PIPLITE,
     PKG_JSON_WHEELDIR,
+    PROJECTS_JSON,
+    PROJECTS_SHARDS,
     PYODIDE_KERNEL_NPM_NAME,
+    PYODIDE_MARKER_ENV,
+    PYODIDE_SITE_PACKAGES,
     PYPI_WHEELS,
     KERNEL_SETTINGS_SCHEMA,
+    WHEEL_INDEX_MANIFEST,
+    WHEEL_META_JSONL,
+    WHEEL_META_SUFFIX,
 )
 
+#: the number of bytes read at a time when hashing wheels
+HASH_CHUNK_SIZE = 1024 * 1024
+
 
 class PipliteAddon(_BaseAddon):
     __all__ = ["post_init", "build", "post_build", "check"]
@@ -42,11 +64,65 @@ class PipliteAddon(_BaseAddon):
         help="Local paths or URLs of piplite-compatible wheels to copy and index",
     ).tag(config=True)
 
+    piplite_jobs: int = Int(
+        1,
+        min=0,
+        help=(
+            "Number of processes to use for extracting wheel metadata: "
+            "1 indexes each wheel in its own task, 0 uses all available CPUs"
+        ),
+    ).tag(config=True)
+
+    piplite_index_shards: bool = Bool(
+        False,
+        help=(
+            "Also write one JSON file per project next to all.json, and a manifest"
+            " of project names to use in pipliteUrls, so the kernel only fetches"
+            " the projects it needs"
+        ),
+    ).tag(config=True)
+
+    piplite_install: _Tuple[str] = TypedTuple(
+        Unicode(),
+        help=(
+            "Requirements to install when the kernel starts, after its own packages:"
+            " requires piplite_lock"
+        ),
+    ).tag(config=True)
+
+    piplite_lock: bool = Bool(
+        False,
+        help=(
+            "Resolve the packages installed when the kernel starts to exact wheels"
+            " from the piplite indices, so the kernel can skip resolving them"
+        ),
+    ).tag(config=True)
+
+    piplite_site_packages: bool = Bool(
+        False,
+        help=(
+            "Also write the locked wheels as installed in site-packages to a single"
+            " archive, which the kernel extracts instead of installing each wheel"
+        ),
+    ).tag(config=True)
+
+    piplite_compile: bool = Bool(
+        False,
+        help=(
+            "Include .pyc files in the site-packages archive: the build must use the"
+            " same version of Python as pyodide"
+        ),
+    ).tag(config=True)
+
     # CLI
     aliases = {
         "piplite-wheels": "PipliteAddon.piplite_urls",
+        "piplite-jobs": "PipliteAddon.piplite_jobs",
+        "piplite-install": "PipliteAddon.piplite_install",
     }
 
+    _wheel_meta_cache = None
+
     @property
     def output_wheels(self):
         """where wheels will go in the output folder"""
@@ -57,6 +133,18 @@ class PipliteAddon(_BaseAddon):
         """where wheels will go in the cache folder"""
         return self.manager.cache_dir / "wheels"
 
+    @property
+    def wheel_meta_cache(self):
+        """a store of wheel metadata, shared by all builds using the cache folder"""
+        if self._wheel_meta_cache is None:
+            self._wheel_meta_cache = WheelMetaCache(self.wheel_cache / WHEEL_META_JSONL)
+        return self._wheel_meta_cache
+
+    @property
+    def wheel_index_manifest(self):
+        """the record of what each entry in the output all.json came from"""
+        return self.wheel_cache / WHEEL_INDEX_MANIFEST
+
     @property
     def output_extensions(self):
         """where labextensions will go in the output folder"""
@@ -94,6 +182,12 @@ class PipliteAddon(_BaseAddon):
 
     def post_build(self, manager):
         """update the root jupyter-lite.json with user-provided ``pipliteUrls``"""
+        if self.piplite_install and not self.piplite_lock:
+            raise ValueError(
+                "PipliteAddon.piplite_install is only installed from the lock: "
+                "also set PipliteAddon.piplite_lock"
+            )
+
         jupyterlite_json = manager.output_dir / JUPYTERLITE_JSON
         whl_metas = []
 
@@ -106,33 +200,70 @@ class PipliteAddon(_BaseAddon):
         )
 
         for wheel in wheels:
-            whl_meta = self.wheel_cache / f"{wheel.name}.meta.json"
+            whl_meta = self.wheel_cache / f"{wheel.name}{WHEEL_META_SUFFIX}"
             whl_metas += [whl_meta]
+            if self.piplite_jobs == 1:
+                yield self.task(
+                    name=f"meta:{whl_meta.name}",
+                    doc=f"ensure {wheel} metadata",
+                    file_dep=[wheel],
+                    actions=[
+                        (doit.tools.create_folder, [whl_meta.parent]),
+                        (self.index_wheel, [wheel, whl_meta]),
+                    ],
+                    targets=[whl_meta],
+                )
+
+        if wheels and self.piplite_jobs != 1:
             yield self.task(
-                name=f"meta:{whl_meta.name}",
-                doc=f"ensure {wheel} metadata",
-                file_dep=[wheel],
+                name="meta",
+                doc=f"ensure metadata for {len(wheels)} wheels",
+                file_dep=wheels,
                 actions=[
-                    (doit.tools.create_folder, [whl_meta.parent]),
-                    (self.index_wheel, [wheel, whl_meta]),
+                    (doit.tools.create_folder, [self.wheel_cache]),
+                    (self.index_wheels, [wheels, whl_metas]),
                 ],
-                targets=[whl_meta],
+                targets=whl_metas,
             )
 
         if whl_metas or pkg_jsons:
             whl_index = self.manager.output_dir / PYPI_WHEELS / ALL_JSON
+            whl_lock = whl_index.parent / PIPLITE_LOCK
+            targets = [whl_index]
+
+            if whl_metas and self.piplite_index_shards:
+                targets += [whl_index.parent / PROJECTS_JSON]
+
+            if self.piplite_lock:
+                targets += [whl_lock]
+
+            if self.piplite_lock and self.piplite_site_packages:
+                targets += [whl_lock.parent / PIPLITE_SITE_PACKAGES]
 
             yield self.task(
                 name="patch",
                 doc=f"ensure {JUPYTERLITE_JSON} includes any piplite wheels",
                 file_dep=[*whl_metas, jupyterlite_json],
+                uptodate=[
+                    doit.tools.config_changed(
+                        dict(
+                            index_shards=self.piplite_index_shards,
+                            lock=self.piplite_lock,
+                            install=list(self.piplite_install),
+                            site_packages=self.piplite_site_packages,
+                            compile=self.piplite_compile,
+                        )
+                    )
+                ],
                 actions=[
+                    (self.update_wheel_index, [whl_index, whl_metas]),
                     (
                         self.patch_jupyterlite_json,
                         [jupyterlite_json, whl_index, whl_metas, pkg_jsons],
-                    )
+                    ),
+                    (self.write_wheel_lock, [jupyterlite_json, whl_lock]),
                 ],
-                targets=[whl_index],
+                targets=targets,
             )
 
     def check(self, manager):
@@ -172,6 +303,13 @@ class PipliteAddon(_BaseAddon):
 
         path = self.manager.output_dir / wheel_index_url
 
+        if path.name == PROJECTS_JSON:
+            # the shards are all described by the neighboring all.json
+            path = path.parent / ALL_JSON
+            wheel_index_url = (
+                f"./{path.relative_to(self.manager.output_dir).as_posix()}"
+            )
+
         if not path.exists():  # pragma: no cover
             return
 
@@ -236,21 +374,19 @@ class PipliteAddon(_BaseAddon):
 
         # first add user-specified wheels from piplite_urls
         if whl_metas:
-            metadata = {}
-            for whl_meta in whl_metas:
-                meta = json.loads(whl_meta.read_text(**UTF8))
-                whl = self.output_wheels / whl_meta.name.replace(".json", "")
-                metadata[whl] = meta["name"], meta["version"], meta["release"]
-
-            write_wheel_index(self.output_wheels, metadata)
+            user_whl_projects = user_whl_index.parent / PROJECTS_JSON
+            known_urls = [
+                self.get_index_urls(index, with_sha=False)[0]
+                for index in [user_whl_index, user_whl_projects]
+            ]
             user_whl_index_url, user_whl_index_url_with_sha = self.get_index_urls(
-                user_whl_index
+                user_whl_projects if self.piplite_index_shards else user_whl_index
             )
 
             added_build = False
 
             for url in old_urls:
-                if url.split("#")[0].split("?")[0] == user_whl_index_url:
+                if url.split("#")[0].split("?")[0] in known_urls:
                     new_urls += [user_whl_index_url_with_sha]
                     added_build = True
                 else:
@@ -277,16 +413,276 @@ class PipliteAddon(_BaseAddon):
             plugin_config[PIPLITE_URLS] = new_urls
             self.set_pyodide_settings(config_path, plugin_config)
 
-    def get_index_urls(self, whl_index):
-        """get output dir relative URLs for all.json files"""
-        whl_index_sha256 = sha256(whl_index.read_bytes()).hexdigest()
+    def write_wheel_lock(self, config_path, whl_lock):
+        """Lock the packages installed when the kernel starts, and add the lock to
+        jupyter-lite.json
+
+        The lock records the ``sha256`` of each local index it was resolved from, so
+        the kernel can tell when it is stale.
+        """
+        plugin_config = self.get_pyodide_settings(config_path)
+        archive = whl_lock.parent / PIPLITE_SITE_PACKAGES
+
+        if archive.exists() and not (self.piplite_lock and self.piplite_site_packages):
+            archive.unlink()
+
+        if not self.piplite_lock:
+            if whl_lock.exists():
+                whl_lock.unlink()
+            if plugin_config.pop(PIPLITE_LOCK_URL, None):
+                self.set_pyodide_settings(config_path, plugin_config)
+            return
+
+        indices = {}
+
+        for url in plugin_config.get(PIPLITE_URLS, []):
+            whl_index = self.get_local_wheel_index(url)
+            if whl_index is None:
+                continue
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(url).query)
+            indices[whl_index] = (
+                query.get("sha256") or [get_wheel_digests(whl_index)[0]]
+            )[0]
+
+        lock = get_wheel_lock(
+            [*PIPLITE_BOOTSTRAP, *self.piplite_install], [*indices], whl_lock.parent
+        )
+        lock["indices"] = {
+            self.get_index_urls(whl_index, with_sha=False)[0]: whl_sha256
+            for whl_index, whl_sha256 in indices.items()
+        }
+
+        if self.piplite_site_packages:
+            lock["site_packages"] = self.write_site_packages(lock, archive)
+
+        whl_lock.parent.mkdir(parents=True, exist_ok=True)
+        whl_lock.write_text(json.dumps(lock, **JSON_FMT), **UTF8)
+        self.maybe_timestamp(whl_lock)
+
+        plugin_config[PIPLITE_LOCK_URL] = self.get_index_urls(whl_lock)[1]
+        self.set_pyodide_settings(config_path, plugin_config)
+
+    def write_site_packages(self, lock, archive):
+        """Write the locked wheels, as installed, to an archive next to the lock"""
+        whl_paths = [archive.parent / package["url"] for package in lock["packages"]]
+        compile_pyc = self.piplite_compile
+
+        if compile_pyc and sys.version_info[:2] != tuple(
+            map(int, PYODIDE_MARKER_ENV["python_version"].split("."))
+        ):  # pragma: no cover
+            self.log.warning(
+                "[piplite] not compiling .pyc for python %s with python %s.%s",
+                PYODIDE_MARKER_ENV["python_version"],
+                *sys.version_info[:2],
+            )
+            compile_pyc = False
+
+        archive.parent.mkdir(parents=True, exist_ok=True)
+        write_site_packages(whl_paths, archive, compile_pyc)
+        self.maybe_timestamp(archive)
+
+        return {
+            "url": archive.name,
+            "sha256": get_wheel_digests(archive)[0],
+            "packages": [package["name"] for package in lock["packages"]],
+        }
+
+    def get_local_wheel_index(self, wheel_index_url):
+        """get the all.json in the output folder described by a piplite URL"""
+        if not wheel_index_url.startswith("./"):
+            return None
+
+        path = self.manager.output_dir / wheel_index_url.split("?")[0].split("#")[0]
+
+        if path.name == PROJECTS_JSON:
+            path = path.parent / ALL_JSON
+
+        return path if path.name == ALL_JSON and path.exists() else None
+
+    def update_wheel_index(self, whl_index, whl_metas, changed):
+        """Apply only added, removed, or changed releases to an existing all.json
+
+        A manifest in the cache folder records the release each wheel provided, and
+        the serialized JSON of each project: if it doesn't describe the current
+        ``whl_index``, the whole index is rebuilt from ``whl_metas``.
+        """
+        if not whl_metas:
+            return
+
+        manifest = self.load_wheel_index_manifest(whl_index)
+        changed = {Path(path) for path in changed}
+        current = {meta.name[: -len(WHEEL_META_SUFFIX)]: meta for meta in whl_metas}
+        wheels = manifest["wheels"]
+        projects = manifest["projects"]
+
+        removed = sorted(set(wheels) - set(current))
+        dirty = sorted(
+            whl_name
+            for whl_name, whl_meta in current.items()
+            if whl_name not in wheels or whl_meta in changed
+        )
+
+        if not (removed or dirty) and whl_index.exists():
+            return
+
+        self.log.debug(
+            "[piplite] updating %s: %s removed, %s added or changed",
+            whl_index,
+            len(removed),
+            len(dirty),
+        )
+
+        touched = set()
+        metas = {}
+
+        for whl_name in removed:
+            touched.add(tuple(wheels.pop(whl_name)))
+
+        for whl_name in dirty:
+            if whl_name in wheels:
+                touched.add(tuple(wheels[whl_name]))
+            meta = metas[whl_name] = json.loads(current[whl_name].read_text(**UTF8))
+            wheels[whl_name] = [normalize_name(meta["name"]), meta["version"]]
+            touched.add(tuple(wheels[whl_name]))
+
+        providers = {}
+        for whl_name in sorted(wheels):
+            providers[tuple(wheels[whl_name])] = whl_name
+
+        releases = {}
+        for normalized_name, version in sorted(touched):
+            if normalized_name not in releases:
+                fragment = projects.get(normalized_name)
+                releases[normalized_name] = (
+                    json.loads(fragment)["releases"] if fragment else {}
+                )
+            project_releases = releases[normalized_name]
+            whl_name = providers.get((normalized_name, version))
+            if whl_name is None:
+                project_releases.pop(version, None)
+                continue
+            if whl_name not in metas:
+                metas[whl_name] = json.loads(current[whl_name].read_text(**UTF8))
+            project_releases[version] = [metas[whl_name]["release"]]
+
+        for normalized_name, project_releases in releases.items():
+            if project_releases:
+                projects[normalized_name] = dump_wheel_index_project(
+                    {"releases": project_releases}
+                )
+            else:
+                projects.pop(normalized_name, None)
+
+        whl_index.write_text(dump_wheel_index(projects), **UTF8)
+        manifest["sha256"] = get_wheel_digests(whl_index)[0]
+
+        if self.piplite_index_shards:
+            shards = manifest["shards"]
+            for normalized_name, project_releases in releases.items():
+                if project_releases:
+                    shards[normalized_name] = write_wheel_index_shard(
+                        whl_index.parent,
+                        normalized_name,
+                        {"releases": project_releases},
+                    )
+                else:
+                    shards.pop(normalized_name, None)
+                    delete_wheel_index_shard(whl_index.parent, normalized_name)
+            write_wheel_index_shards_manifest(whl_index.parent, shards)
+
+        self.wheel_index_manifest.write_text(json.dumps(manifest), **UTF8)
+
+    def load_wheel_index_manifest(self, whl_index):
+        """Get the manifest of an existing all.json, or an empty one if stale"""
+        shards = {} if self.piplite_index_shards else None
+        empty = {"sha256": None, "wheels": {}, "projects": {}, "shards": shards}
+
+        if not (whl_index.exists() and self.wheel_index_manifest.exists()):
+            return empty
+
+        if shards is not None and not (whl_index.parent / PROJECTS_JSON).exists():
+            return empty
+
+        try:
+            manifest = json.loads(self.wheel_index_manifest.read_text(**UTF8))
+        except ValueError:
+            return empty
+
+        if manifest.get("sha256") != get_wheel_digests(whl_index)[0]:
+            return empty
+
+        if (manifest.get("shards") is None) != (shards is None):
+            return empty
+
+        return manifest
+
+    def get_index_urls(self, whl_index, with_sha=True):
+        """get output dir relative URLs for all.json (or projects.json) files"""
         whl_index_url = f"./{whl_index.relative_to(self.manager.output_dir).as_posix()}"
+        if not with_sha:
+            return whl_index_url, None
+        whl_index_sha256 = get_wheel_digests(whl_index)[0]
         whl_index_url_with_sha = f"{whl_index_url}?sha256={whl_index_sha256}"
         return whl_index_url, whl_index_url_with_sha
 
     def index_wheel(self, whl_path, whl_meta):
         """Generate an intermediate file representation to merge with other releases"""
-        name, version, release = get_wheel_fileinfo(whl_path)
+        self.write_wheel_meta(
+            whl_meta, get_wheel_fileinfo(whl_path, self.wheel_meta_cache)
+        )
+
+    def index_wheels(self, whl_paths, whl_metas, changed):
+        """Generate the intermediate files for many wheels with a process pool
+
+        Only wheels that ``doit`` reports as ``changed``, or which are missing their
+        metadata, are re-indexed.
+        """
+        changed = {Path(path) for path in changed}
+        meta_cache = self.wheel_meta_cache
+        todo = []
+
+        for whl_path, whl_meta in zip(whl_paths, whl_metas):
+            if whl_path not in changed and whl_meta.exists():
+                continue
+            if meta_cache.get(whl_path, whl_path.stat()):
+                self.write_wheel_meta(
+                    whl_meta, get_wheel_fileinfo(whl_path, meta_cache)
+                )
+            else:
+                todo += [(whl_path, whl_meta)]
+
+        if not todo:
+            return
+
+        max_workers = min(self.piplite_jobs or os.cpu_count() or 1, len(todo))
+        self.log.debug("[piplite] indexing %s wheels with %s", len(todo), max_workers)
+
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            whl_stats = [whl_path.stat() for whl_path, whl_meta in todo]
+            entries = executor.map(
+                get_wheel_meta_entry, [whl for whl, meta in todo], whl_stats
+            )
+            for (whl_path, whl_meta), entry in zip(todo, entries):
+                meta_cache.put(entry)
+                self.write_wheel_meta(
+                    whl_meta, get_wheel_fileinfo(whl_path, meta_cache)
+                )
+
+        whl_bytes = sum(whl_stat.st_size for whl_stat in whl_stats)
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.log.info(
+            "[piplite] indexed %s wheels (%s bytes) in %.2fs: %.1f MB/s",
+            len(todo),
+            whl_bytes,
+            elapsed,
+            whl_bytes / elapsed / 1e6,
+        )
+
+    def write_wheel_meta(self, whl_meta, fileinfo):
+        """Write out the intermediate file representation of a single wheel"""
+        name, version, release = fileinfo
         whl_meta.write_text(
             json.dumps(dict(name=name, version=version, release=release), **JSON_FMT),
             **UTF8,
@@ -299,23 +695,89 @@ def list_wheels(wheel_dir):
     return sorted(sum([[*wheel_dir.glob(f"*{whl}")] for whl in ALL_WHL], []))
 
 
-def get_wheel_fileinfo(whl_path):
-    """Generate a minimal Warehouse-like JSON API entry from a wheel"""
-    import pkginfo
+def get_wheel_fileinfo(whl_path, meta_cache=None):
+    """Generate a minimal Warehouse-like JSON API entry from a wheel
 
-    metadata = pkginfo.get_metadata(str(whl_path))
+    If given a ``WheelMetaCache``, wheels it has already seen are not re-read.
+    """
     whl_stat = whl_path.stat()
+    entry = meta_cache.get(whl_path, whl_stat) if meta_cache else None
+
+    if entry is None:
+        entry = get_wheel_meta_entry(whl_path, whl_stat, meta_cache)
+        if meta_cache:
+            meta_cache.put(entry)
+
+    release = get_wheel_release(
+        whl_path,
+        whl_stat,
+        entry["sha256"],
+        entry["md5"],
+        entry["requires_python"],
+    )
+
+    return entry["name"], entry["version"], release
+
+
+def get_wheel_meta_entry(whl_path, whl_stat, meta_cache=None):
+    """Read the minimal metadata and digests of a wheel, as stored in the cache
+
+    If the wheel's content is already known to a ``WheelMetaCache`` under another
+    stat key, only the digests are recomputed.
+    """
+    whl_sha256, whl_md5 = get_wheel_digests(whl_path)
+    known = meta_cache.get_by_sha256(whl_sha256) if meta_cache else None
+
+    if known is None:
+        import pkginfo
+
+        metadata = pkginfo.get_metadata(str(whl_path))
+        known = dict(
+            name=metadata.name,
+            version=metadata.version,
+            requires_python=metadata.requires_python,
+        )
+
+    return dict(
+        **WheelMetaCache.stat_key(whl_path, whl_stat),
+        name=known["name"],
+        version=known["version"],
+        requires_python=known["requires_python"],
+        sha256=whl_sha256,
+        md5=whl_md5,
+    )
+
+
+def get_wheel_digests(whl_path, chunk_size=HASH_CHUNK_SIZE):
+    """Get the sha256 and md5 hex digests of a file in a single streaming pass
+
+    Only one ``chunk_size`` buffer is held in memory, whatever the size of the file.
+    """
+    whl_sha256, whl_md5 = sha256(), md5()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    with whl_path.open("rb", buffering=0) as fd:
+        while True:
+            read = fd.readinto(buffer)
+            if not read:
+                break
+            whl_sha256.update(view[:read])
+            whl_md5.update(view[:read])
+
+    return whl_sha256.hexdigest(), whl_md5.hexdigest()
+
+
+def get_wheel_release(whl_path, whl_stat, whl_sha256, whl_md5, requires_python):
+    """Generate a Warehouse-like release for a wheel from its digests"""
     whl_isodate = (
         datetime.datetime.fromtimestamp(whl_stat.st_mtime, tz=datetime.timezone.utc)
         .isoformat()
         .split("+")[0]
         + "Z"
     )
-    whl_bytes = whl_path.read_bytes()
-    whl_sha256 = sha256(whl_bytes).hexdigest()
-    whl_md5 = md5(whl_bytes).hexdigest()
 
-    release = {
+    return {
         "comment_text": "",
         "digests": {"sha256": whl_sha256, "md5": whl_md5},
         "downloads": -1,
@@ -324,7 +786,7 @@ def get_wheel_fileinfo(whl_path):
         "md5_digest": whl_md5,
         "packagetype": "bdist_wheel",
         "python_version": "py3",
-        "requires_python": metadata.requires_python,
+        "requires_python": requires_python,
         "size": whl_stat.st_size,
         "upload_time": whl_isodate,
         "upload_time_iso_8601": whl_isodate,
@@ -333,7 +795,80 @@ def get_wheel_fileinfo(whl_path):
         "yanked_reason": None,
     }
 
-    return metadata.name, metadata.version, release
+
+class WheelMetaCache:
+    """An append-only JSONL store of wheel metadata and digests
+
+    Entries are found by ``(st_size, st_mtime_ns, st_ino)``, or by file name, size
+    and ``st_mtime_ns`` for copies of a wheel (e.g. in a fresh ``output_dir``),
+    and finally by ``sha256``, which avoids re-reading the wheel's metadata.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._by_stat = None
+        self._by_copy = None
+        self._by_sha256 = None
+
+    @staticmethod
+    def stat_key(whl_path, whl_stat):
+        """get the fields that identify an unchanged wheel on disk"""
+        return dict(
+            filename=whl_path.name,
+            size=whl_stat.st_size,
+            mtime_ns=whl_stat.st_mtime_ns,
+            ino=whl_stat.st_ino,
+        )
+
+    def load(self):
+        """read all entries, ignoring any unparseable (e.g. truncated) lines"""
+        self._by_stat, self._by_copy, self._by_sha256 = {}, {}, {}
+
+        if not self.path.exists():
+            return
+
+        for line in self.path.read_text(**UTF8).splitlines():
+            try:
+                self._remember(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def get(self, whl_path, whl_stat):
+        """get the entry for an unchanged wheel, without reading it"""
+        if self._by_stat is None:
+            self.load()
+        key = self.stat_key(whl_path, whl_stat)
+        return self._by_stat.get(
+            (key["size"], key["mtime_ns"], key["ino"])
+        ) or self._by_copy.get((key["filename"], key["size"], key["mtime_ns"]))
+
+    def get_by_sha256(self, whl_sha256):
+        """get any entry for a wheel with the same content"""
+        if self._by_sha256 is None:
+            self.load()
+        return self._by_sha256.get(whl_sha256)
+
+    def put(self, entry):
+        """remember, and append, a new entry"""
+        if self._by_stat is None:
+            self.load()
+        self._remember(entry)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", **UTF8) as fd:
+            fd.write(json.dumps(entry, sort_keys=True) + "\n")
+
+    def _remember(self, entry):
+        self._by_stat[entry["size"], entry["mtime_ns"], entry["ino"]] = entry
+        self._by_copy[entry["filename"], entry["size"], entry["mtime_ns"]] = entry
+        self._by_sha256[entry["sha256"]] = entry
+
+
+def normalize_name(name):
+    """Get the normalized name of a project
+
+    https://peps.python.org/pep-0503/#normalized-names
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
 
 
 def get_wheel_index(wheels, metadata=None):
@@ -347,9 +882,8 @@ def get_wheel_index(wheels, metadata=None):
     all_json = {}
 
     for whl_path in sorted(wheels):
-        name, version, release = metadata.get(whl_path, get_wheel_fileinfo(whl_path))
-        # https://peps.python.org/pep-0503/#normalized-names
-        normalized_name = re.sub(r"[-_.]+", "-", name).lower()
+        name, version, release = metadata.get(whl_path) or get_wheel_fileinfo(whl_path)
+        normalized_name = normalize_name(name)
         if normalized_name not in all_json:
             all_json[normalized_name] = {"releases": {}}
         all_json[normalized_name]["releases"][version] = [release]
@@ -357,9 +891,214 @@ def get_wheel_index(wheels, metadata=None):
     return all_json
 
 
-def write_wheel_index(whl_dir, metadata=None):
-    """Write out an all.json for a directory of wheels"""
+def get_wheel_lock(requirements, whl_indices, lock_dir):
+    """Resolve requirements to exact wheels from local indices, in install order
+
+    The ``all.json`` files are searched in order, as by ``piplite`` in the kernel.
+    Requirements (and dependencies) not found in any of them are left
+    ``unresolved``, for the kernel to install as usual. Wheel URLs are relative to
+    ``lock_dir``.
+    """
+    import pkginfo
+    from packaging.requirements import Requirement
+    from packaging.version import InvalidVersion, Version
+
+    projects = {}
+
+    for whl_index in whl_indices:
+        index_data = json.loads(whl_index.read_text(**UTF8))
+        for name, project in index_data.items():
+            projects.setdefault(normalize_name(name), (whl_index, project))
+
+    seen = set()
+    packages = []
+    unresolved = []
+
+    def is_wanted(req, extras):
+        return req.marker is None or any(
+            req.marker.evaluate({**PYODIDE_MARKER_ENV, "extra": extra})
+            for extra in extras or [""]
+        )
+
+    def find_release(req, project):
+        found = []
+        for version, release in project["releases"].items():
+            try:
+                parsed = Version(version)
+            except InvalidVersion:
+                continue
+            if release and req.specifier.contains(parsed):
+                found += [(parsed, version, release[0])]
+        return max(found) if found else None
+
+    def add(requirement, extras=None):
+        req = Requirement(requirement)
+
+        if not is_wanted(req, extras):
+            return
+
+        name = normalize_name(req.name)
+
+        if name in seen:
+            return
+
+        seen.add(name)
+        whl_index, project = projects.get(name, (None, None))
+        found = find_release(req, project) if project else None
+
+        if found is None:
+            unresolved.append(requirement.split(";")[0].strip())
+            return
+
+        parsed, version, artifact = found
+        whl_path = whl_index.parent / artifact["url"]
+        depends = []
+
+        for dep in pkginfo.get_metadata(str(whl_path)).requires_dist or []:
+            dep_req = Requirement(dep)
+            if is_wanted(dep_req, req.extras):
+                depends += [normalize_name(dep_req.name)]
+                add(dep, req.extras)
+
+        packages.append(
+            {
+                "name": name,
+                "version": version,
+                "url": Path(os.path.relpath(whl_path, lock_dir)).as_posix(),
+                "sha256": artifact["digests"]["sha256"],
+                "depends": sorted(set(depends)),
+            }
+        )
+
+    for requirement in requirements:
+        add(requirement)
+
+    return {
+        "requirements": [*requirements],
+        "packages": packages,
+        "unresolved": unresolved,
+    }
+
+
+def write_site_packages(whl_paths, archive, compile_pyc=False):
+    """Write the contents of wheels, as installed in site-packages, to one zip
+
+    With ``compile_pyc``, also include unchecked-hash ``.pyc``, which are only
+    usable by the same version of CPython as is running the build.
+    """
+    with tempfile.TemporaryDirectory() as td:
+        site_packages = Path(td)
+
+        for whl_path in whl_paths:
+            extract_wheel(whl_path, site_packages)
+
+        if compile_pyc:
+            compileall.compile_dir(
+                str(site_packages),
+                quiet=1,
+                ddir=PYODIDE_SITE_PACKAGES,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for path in sorted(site_packages.rglob("*")):
+                if path.is_file():
+                    zf.writestr(
+                        zipfile.ZipInfo(path.relative_to(site_packages).as_posix()),
+                        path.read_bytes(),
+                    )
+
+    return archive
+
+
+def extract_wheel(whl_path, site_packages):
+    """Extract the files of a wheel that would be installed in site-packages
+
+    Only ``purelib`` and ``platlib`` are taken from the ``.data`` folder, and an
+    ``INSTALLER`` is added to the ``.dist-info`` folder.
+    """
+    with zipfile.ZipFile(whl_path) as zf:
+        for info in zf.infolist():
+            parts = info.filename.split("/")
+            if info.is_dir() or ".." in parts:
+                continue
+            if parts[0].endswith(".data"):
+                if len(parts) < 3 or parts[1] not in ["purelib", "platlib"]:
+                    continue
+                parts = parts[2:]
+            elif parts[0].endswith(".dist-info") and len(parts) == 2:
+                installer = site_packages / parts[0] / "INSTALLER"
+                installer.parent.mkdir(parents=True, exist_ok=True)
+                installer.write_text("piplite\n", **UTF8)
+            dest = site_packages.joinpath(*parts)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            dest.write_bytes(zf.read(info))
+
+
+def dump_wheel_index_project(project):
+    """Serialize one project of a wheel index, as it will appear in all.json"""
+    return json.dumps(project, **JSON_FMT).replace("\n", "\n  ")
+
+
+def dump_wheel_index(projects):
+    """Serialize a wheel index from already-serialized projects
+
+    The result is the same as ``json.dumps`` of the whole index with ``JSON_FMT``.
+    """
+    if not projects:
+        return "{}"
+    entries = [f"  {json.dumps(name)}: {projects[name]}" for name in sorted(projects)]
+    return "{\n" + ",\n".join(entries) + "\n}"
+
+
+def write_wheel_index(whl_dir, metadata=None, shards=False):
+    """Write out an all.json for a directory of wheels
+
+    If ``shards`` is given, also write a ``projects.json`` manifest of project names,
+    and a JSON file per project, with the same releases as in ``all.json``.
+    """
     wheel_index = Path(whl_dir) / ALL_JSON
     index_data = get_wheel_index(list_wheels(whl_dir), metadata)
     wheel_index.write_text(json.dumps(index_data, **JSON_FMT), **UTF8)
+
+    if shards:
+        shard_dir = Path(whl_dir) / PROJECTS_SHARDS
+        if shard_dir.exists():
+            for stale in sorted(shard_dir.glob("*.json")):
+                if stale.stem not in index_data:
+                    stale.unlink()
+        write_wheel_index_shards_manifest(
+            whl_dir,
+            {
+                name: write_wheel_index_shard(whl_dir, name, project)
+                for name, project in index_data.items()
+            },
+        )
+
     return wheel_index
+
+
+def write_wheel_index_shard(whl_dir, normalized_name, project):
+    """Write the releases of a single project, returning its sha256"""
+    shard = Path(whl_dir) / PROJECTS_SHARDS / f"{normalized_name}.json"
+    shard.parent.mkdir(parents=True, exist_ok=True)
+    shard_text = json.dumps(project, **JSON_FMT)
+    shard.write_text(shard_text, **UTF8)
+    return sha256(shard_text.encode("utf-8")).hexdigest()
+
+
+def delete_wheel_index_shard(whl_dir, normalized_name):
+    """Remove the releases of a project that is no longer provided by any wheel"""
+    shard = Path(whl_dir) / PROJECTS_SHARDS / f"{normalized_name}.json"
+    if shard.exists():
+        shard.unlink()
+
+
+def write_wheel_index_shards_manifest(whl_dir, shards):
+    """Write the manifest of projects, and the sha256 of each of their shards"""
+    projects_json = Path(whl_dir) / PROJECTS_JSON
+    projects_json.write_text(
+        json.dumps({"projects": shards}, **JSON_FMT),
+        **UTF8,
+    )
+    return projects_json
@@ -1,9 +1,10 @@
 """CLI entrypoint for managing piplite wheels"""
 from pathlib import Path
 
-from jupyter_core.application import JupyterApp
+from jupyter_core.application import JupyterApp, base_flags
 from jupyterlite_core.app import DescribedMixin
 from jupyterlite_core.trait_types import CPath
+from traitlets import Bool
 
 from ._version import __version__
 from .addons.piplite import list_wheels
@@ -32,6 +33,18 @@ class PipliteIndex(DescribedMixin, JupyterApp):
 
     wheel_dir = CPath(Path.cwd(), help="a path of wheels")
 
+    shards = Bool(
+        False, help="also write a projects.json manifest and a JSON file per project"
+    ).tag(config=True)
+
+    flags = dict(
+        **base_flags,
+        shards=(
+            {"PipliteIndex": {"shards": True}},
+            shards.help,
+        ),
+    )
+
     def parse_command_line(self, argv=None):
         super(PipliteIndex, self).parse_command_line(argv)
 
@@ -45,7 +58,7 @@ class PipliteIndex(DescribedMixin, JupyterApp):
             raise ValueError(f"no supported wheels found in {self.wheel_dir}")
         from .addons.piplite import write_wheel_index
 
-        write_wheel_index(self.wheel_dir)
+        write_wheel_index(self.wheel_dir, shards=self.shards)
 
 
 class PipliteApp(DescribedMixin, JupyterApp):
@@ -4,6 +4,8 @@
 #: the key for PyPI-compatible API responses pointing to wheels
 PIPLITE_URLS = "pipliteUrls"
 DISABLE_PYPI_FALLBACK = "disablePyPIFallback"
+#: the key for the lock of packages installed when the kernel starts
+PIPLITE_LOCK_URL = "pipliteLockUrl"
 #: the schema for piplite-compatible wheel index
 PIPLITE_INDEX_SCHEMA = "piplite.v0.schema.json"
 #: the schema for piplite-compatible wheel index
@@ -14,6 +16,22 @@ PYPI_WHEELS = "pypi"
 PYODIDE_KERNEL_PLUGIN_ID = "@jupyterlite/pyodide-kernel-extension:kernel"
 #: the npm name of the pyodide kernel
 PYODIDE_KERNEL_NPM_NAME = PYODIDE_KERNEL_PLUGIN_ID.split(":")[0]
+#: the append-only store of wheel metadata in the cache folder
+WHEEL_META_JSONL = "wheel-meta.v0.jsonl"
+#: the suffix of the intermediate metadata for a single wheel in the cache folder
+WHEEL_META_SUFFIX = ".meta.json"
+#: the record of the releases in an output all.json, in the cache folder
+WHEEL_INDEX_MANIFEST = "all.manifest.v0.json"
+#: the manifest of projects in a sharded piplite index, next to all.json
+PROJECTS_JSON = "projects.json"
+#: the folder of per-project JSON in a sharded piplite index
+PROJECTS_SHARDS = "projects"
+#: the wheels to install when the kernel starts, next to the output all.json
+PIPLITE_LOCK = "piplite-lock.v0.json"
+#: the installed contents of the locked wheels, next to the lock
+PIPLITE_SITE_PACKAGES = "piplite-site-packages.v0.zip"
+#: the packages the kernel installs before it starts, as in ``worker.ts``
+PIPLITE_BOOTSTRAP = ["sqlite3", "ipykernel", "comm", "pyodide_kernel", "ipython"]
 #: the package.json key for piplite
 PKG_JSON_PIPLITE = "piplite"
 #: the package.json/piplite key for wheels
@@ -31,6 +49,24 @@ PYODIDE_URL_ENV_VAR = "JUPYTERLITE_PYODIDE_URL"
 #: probably only compatible with this version of pyodide
 PYODIDE_VERSION = "0.24.1"
 
+#: where pure python packages are installed, for this version of pyodide
+PYODIDE_SITE_PACKAGES = "/lib/python3.11/site-packages"
+
+#: the environment for evaluating dependency markers, for this version of pyodide
+PYODIDE_MARKER_ENV = {
+    "implementation_name": "cpython",
+    "implementation_version": "3.11.3",
+    "os_name": "posix",
+    "platform_machine": "wasm32",
+    "platform_python_implementation": "CPython",
+    "platform_release": "3.1.45",
+    "platform_system": "Emscripten",
+    "platform_version": "#1",
+    "python_full_version": "3.11.3",
+    "python_version": "3.11",
+    "sys_platform": "emscripten",
+}
+
 #: the only kind of noarch wheel piplite understands
 NOARCH_WHL = "py3-none-any.whl"
 
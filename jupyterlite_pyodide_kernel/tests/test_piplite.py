@@ -1,6 +1,9 @@
 """tests of various mechanisms of providing federated_extensions"""
 import json
 import shutil
+import sys
+import zipfile
+from hashlib import md5, sha256
 
 import pytest
 from pytest import mark
@@ -18,10 +21,26 @@ from jupyterlite_core.constants import (
 from jupyterlite_pyodide_kernel.constants import (
     PYODIDE_KERNEL_PLUGIN_ID,
     DISABLE_PYPI_FALLBACK,
+    PIPLITE_BOOTSTRAP,
+    PIPLITE_LOCK,
+    PIPLITE_LOCK_URL,
+    PYODIDE_MARKER_ENV,
+    WHEEL_META_JSONL,
+)
+
+from jupyterlite_pyodide_kernel.addons.piplite import (
+    dump_wheel_index,
+    dump_wheel_index_project,
+    get_wheel_digests,
+    get_wheel_index,
+    list_wheels,
 )
 
 from .conftest import WHEELS, PYODIDE_KERNEL_EXTENSION
 
+PYODIDE_PYTHON = tuple(map(int, PYODIDE_MARKER_ENV["python_version"].split(".")))
+IS_PYODIDE_PYTHON = sys.version_info[:2] == PYODIDE_PYTHON
+
 
 def has_wheel_after_build(an_empty_lite_dir, script_runner):
     """run a build, expecting the fixture wheel to be there"""
@@ -85,6 +104,87 @@ def test_piplite_urls(
     has_wheel_after_build(an_empty_lite_dir, script_runner)
 
 
+def copy_wheel_versions(dest, count):
+    """copy the fixture wheel as ``count`` versions, to index more than one"""
+    wheel = WHEELS[0]
+    name, version = wheel.name.split("-")[:2]
+    paths = []
+
+    for i in range(count):
+        new_version = f"{version}.{i}"
+        path = dest / wheel.name.replace(f"-{version}-", f"-{new_version}-")
+        with zipfile.ZipFile(wheel) as src, zipfile.ZipFile(path, "w") as dst:
+            for info in src.infolist():
+                data = src.read(info)
+                if info.filename.endswith(".dist-info/METADATA"):
+                    data = data.replace(
+                        f"Version: {version}".encode(),
+                        f"Version: {new_version}".encode(),
+                    )
+                filename = info.filename.replace(
+                    f"{name}-{version}.", f"{name}-{new_version}."
+                )
+                dst.writestr(filename, data)
+        paths += [path]
+
+    return paths
+
+
+@mark.parametrize("jobs", [0, 2])
+def test_piplite_jobs(an_empty_lite_dir, script_runner, jobs):
+    """does indexing wheels in a process pool give the same index as in serial?"""
+    wheels = copy_wheel_versions(an_empty_lite_dir, 4)
+
+    config = {
+        "LiteBuildConfig": {
+            "apps": ["lab"],
+            "ignore_sys_prefix": True,
+            "federated_extensions": [
+                str(PYODIDE_KERNEL_EXTENSION),
+            ],
+        },
+        "PipliteAddon": {
+            "piplite_urls": [wheel.name for wheel in wheels],
+        },
+    }
+
+    (an_empty_lite_dir / "jupyter_lite_config.json").write_text(json.dumps(config))
+
+    build = script_runner.run(
+        ["jupyter", "lite", "build", "--piplite-jobs", "1"],
+        cwd=str(an_empty_lite_dir),
+    )
+    assert build.success
+    wheel_index = an_empty_lite_dir / "_output/pypi/all.json"
+    serial_index = wheel_index.read_bytes()
+    releases = json.loads(serial_index)["the-smallest-extension"]["releases"]
+    assert len(releases) == len(wheels)
+
+    shutil.rmtree(an_empty_lite_dir / "_output")
+    shutil.rmtree(an_empty_lite_dir / ".cache", ignore_errors=True)
+    (an_empty_lite_dir / ".jupyterlite.doit.db").unlink(missing_ok=True)
+
+    build = script_runner.run(
+        ["jupyter", "lite", "build", "--piplite-jobs", f"{jobs}"],
+        cwd=str(an_empty_lite_dir),
+    )
+    assert build.success
+    assert "indexed 4 wheels" in build.stderr + build.stdout
+    assert wheel_index.read_bytes() == serial_index
+
+
+def test_piplite_jobs_negative(an_empty_lite_dir, script_runner):
+    """is a negative number of processes reported, rather than reaching the pool?"""
+    build = script_runner.run(
+        ["jupyter", "lite", "build", "--piplite-jobs=-1"],
+        cwd=str(an_empty_lite_dir),
+    )
+    output = build.stderr + build.stdout
+    assert "'piplite_jobs' trait" in output
+    assert "should not be less than 0" in output
+    assert "max_workers must be greater than 0" not in output
+
+
 def test_lite_dir_wheel(an_empty_lite_dir, script_runner):
     wheel_dir = an_empty_lite_dir / "pypi"
     wheel_dir.mkdir()
@@ -93,6 +193,72 @@ def test_lite_dir_wheel(an_empty_lite_dir, script_runner):
     has_wheel_after_build(an_empty_lite_dir, script_runner)
 
 
+def test_wheel_meta_cache(an_empty_lite_dir, script_runner):
+    """are unchanged wheels only indexed once, even with a fresh output_dir?"""
+    wheel_dir = an_empty_lite_dir / "pypi"
+    wheel_dir.mkdir()
+    shutil.copy2(WHEELS[0], wheel_dir / WHEELS[0].name)
+    meta_cache = an_empty_lite_dir / ".cache/wheels" / WHEEL_META_JSONL
+
+    has_wheel_after_build(an_empty_lite_dir, script_runner)
+    assert len(meta_cache.read_text(**UTF8).splitlines()) == 1
+
+    shutil.rmtree(an_empty_lite_dir / "_output")
+    (an_empty_lite_dir / ".jupyterlite.doit.db").unlink(missing_ok=True)
+
+    has_wheel_after_build(an_empty_lite_dir, script_runner)
+    assert len(meta_cache.read_text(**UTF8).splitlines()) == 1
+
+
+def test_wheel_index_incremental(an_empty_lite_dir, script_runner):
+    """is an incrementally-updated all.json the same as a fresh one?"""
+    wheel_dir = an_empty_lite_dir / "pypi"
+    wheel_dir.mkdir()
+    shutil.copy2(WHEELS[0], wheel_dir / WHEELS[0].name)
+    output_wheels = an_empty_lite_dir / "_output/pypi"
+    wheel_index = output_wheels / "all.json"
+    # a second wheel providing the same release
+    other = "the_smallest_extension-0.1.1-py3-none-any.whl"
+
+    def assert_same_as_fresh():
+        build = script_runner.run(
+            ["jupyter", "lite", "build"], cwd=str(an_empty_lite_dir)
+        )
+        assert build.success
+        incremental = wheel_index.read_text(**UTF8)
+        fresh = json.dumps(get_wheel_index(list_wheels(output_wheels)), **JSON_FMT)
+        assert incremental == fresh
+
+    assert_same_as_fresh()
+    shutil.copy2(WHEELS[0], wheel_dir / other)
+    assert_same_as_fresh()
+    assert other in wheel_index.read_text(**UTF8)
+    (wheel_dir / other).unlink()
+    (output_wheels / other).unlink()
+    assert_same_as_fresh()
+    assert other not in wheel_index.read_text(**UTF8)
+
+
+@mark.parametrize(
+    "projects",
+    [{}, {"a": {"releases": {}}}, {"b-c": {"releases": {"1": [{"x": [1, {}]}]}}}],
+)
+def test_dump_wheel_index(projects):
+    """is a wheel index built from serialized projects the same as a whole one?"""
+    dumped = {name: dump_wheel_index_project(p) for name, p in projects.items()}
+    assert dump_wheel_index(dumped) == json.dumps(projects, **JSON_FMT)
+
+
+@mark.parametrize("chunk_size", [1, 1000, 1024 * 1024])
+def test_wheel_digests(chunk_size):
+    """are streamed digests the same as hashing the whole wheel?"""
+    whl_bytes = WHEELS[0].read_bytes()
+    assert get_wheel_digests(WHEELS[0], chunk_size) == (
+        sha256(whl_bytes).hexdigest(),
+        md5(whl_bytes).hexdigest(),
+    )
+
+
 def test_piplite_cli_fail_missing(script_runner, tmp_path, index_cmd):
     path = tmp_path / "missing"
     build = script_runner.run([*index_cmd, str(path)])
@@ -118,6 +284,163 @@ def test_piplite_cli_win(script_runner, tmp_path, index_cmd, in_cwd):
     assert json.loads((path / "all.json").read_text(encoding="utf-8"))
 
 
+def test_piplite_index_shards(an_empty_lite_dir, script_runner):
+    """can we use a per-project index in pipliteUrls?"""
+    wheel_dir = an_empty_lite_dir / "pypi"
+    wheel_dir.mkdir()
+    shutil.copy2(WHEELS[0], wheel_dir / WHEELS[0].name)
+    config = {"PipliteAddon": {"piplite_index_shards": True}}
+    (an_empty_lite_dir / "jupyter_lite_config.json").write_text(json.dumps(config))
+
+    has_wheel_after_build(an_empty_lite_dir, script_runner)
+
+    output = an_empty_lite_dir / "_output"
+    lite_data = json.loads((output / JUPYTERLITE_JSON).read_text(**UTF8))
+    urls = lite_data[JUPYTER_CONFIG_DATA][LITE_PLUGIN_SETTINGS][
+        PYODIDE_KERNEL_PLUGIN_ID
+    ]["pipliteUrls"]
+    assert urls[0].startswith("./pypi/projects.json?sha256="), urls
+
+    all_json = json.loads((output / "pypi/all.json").read_text(**UTF8))
+    projects = json.loads((output / "pypi/projects.json").read_text(**UTF8))
+    assert sorted(projects["projects"]) == sorted(all_json)
+
+    for name, project in all_json.items():
+        shard = output / f"pypi/projects/{name}.json"
+        assert json.loads(shard.read_text(**UTF8)) == project
+
+
+def test_piplite_cli_shards(script_runner, tmp_path, index_cmd):
+    path = tmp_path / "one"
+    path.mkdir()
+    shutil.copy2(WHEELS[0], path / WHEELS[0].name)
+    build = script_runner.run([*index_cmd, "--shards", str(path)])
+    assert build.success
+    projects = json.loads((path / "projects.json").read_text(encoding="utf-8"))
+    for name in projects["projects"]:
+        assert (path / f"projects/{name}.json").exists()
+
+
+def test_piplite_lock(an_empty_lite_dir, script_runner):
+    """are the packages installed at kernel start locked to local wheels?"""
+    wheel_dir = an_empty_lite_dir / "pypi"
+    wheel_dir.mkdir()
+    shutil.copy2(WHEELS[0], wheel_dir / WHEELS[0].name)
+    install = [
+        "the-smallest-extension",
+        "not-a-local-package>=1; sys_platform == 'emscripten'",
+        "not-for-pyodide; sys_platform == 'win32'",
+    ]
+    config = {"PipliteAddon": {"piplite_install": install, "piplite_lock": True}}
+    (an_empty_lite_dir / "jupyter_lite_config.json").write_text(json.dumps(config))
+
+    has_wheel_after_build(an_empty_lite_dir, script_runner)
+
+    output = an_empty_lite_dir / "_output"
+    lite_data = json.loads((output / JUPYTERLITE_JSON).read_text(**UTF8))
+    settings = lite_data[JUPYTER_CONFIG_DATA][LITE_PLUGIN_SETTINGS][
+        PYODIDE_KERNEL_PLUGIN_ID
+    ]
+    assert settings[PIPLITE_LOCK_URL].startswith(f"./pypi/{PIPLITE_LOCK}?sha256=")
+
+    lock = json.loads((output / "pypi" / PIPLITE_LOCK).read_text(**UTF8))
+    assert lock["requirements"] == [*PIPLITE_BOOTSTRAP, *install]
+    assert settings["pipliteUrls"][0].endswith(lock["indices"]["./pypi/all.json"])
+
+    packages = {package["name"]: package for package in lock["packages"]}
+    package = packages["the-smallest-extension"]
+    assert package["url"] == WHEELS[0].name
+    assert package["sha256"] == sha256(WHEELS[0].read_bytes()).hexdigest()
+
+    assert "not-a-local-package>=1" in lock["unresolved"]
+    assert not [req for req in lock["unresolved"] if "not-for-pyodide" in req]
+    assert "sqlite3" in lock["unresolved"]
+
+
+def test_piplite_no_lock(an_empty_lite_dir, script_runner):
+    """is there no lock by default, and are unlocked requirements an error?"""
+    wheel_dir = an_empty_lite_dir / "pypi"
+    wheel_dir.mkdir()
+    shutil.copy2(WHEELS[0], wheel_dir / WHEELS[0].name)
+
+    has_wheel_after_build(an_empty_lite_dir, script_runner)
+
+    output = an_empty_lite_dir / "_output"
+    lite_data = json.loads((output / JUPYTERLITE_JSON).read_text(**UTF8))
+    settings = lite_data[JUPYTER_CONFIG_DATA][LITE_PLUGIN_SETTINGS][
+        PYODIDE_KERNEL_PLUGIN_ID
+    ]
+    assert PIPLITE_LOCK_URL not in settings
+    assert not (output / "pypi" / PIPLITE_LOCK).exists()
+
+    config = {"PipliteAddon": {"piplite_install": ["the-smallest-extension"]}}
+    (an_empty_lite_dir / "jupyter_lite_config.json").write_text(json.dumps(config))
+
+    build = script_runner.run(["jupyter", "lite", "build"], cwd=str(an_empty_lite_dir))
+    assert not build.success
+    assert "piplite_lock" in build.stderr + build.stdout
+
+
+@mark.parametrize(
+    "compile_pyc,expect_pyc",
+    [
+        pytest.param(
+            True,
+            True,
+            marks=mark.skipif(not IS_PYODIDE_PYTHON, reason="needs pyodide's python"),
+        ),
+        pytest.param(
+            True,
+            False,
+            marks=mark.skipif(IS_PYODIDE_PYTHON, reason="needs another python"),
+        ),
+        [False, False],
+    ],
+)
+def test_piplite_site_packages(
+    an_empty_lite_dir, script_runner, compile_pyc, expect_pyc
+):
+    """are the locked wheels archived as installed in site-packages?
+
+    ``.pyc`` are only compiled with the same python as pyodide, otherwise a warning
+    is logged.
+    """
+    wheel_dir = an_empty_lite_dir / "pypi"
+    wheel_dir.mkdir()
+    shutil.copy2(WHEELS[0], wheel_dir / WHEELS[0].name)
+    config = {
+        "PipliteAddon": {
+            "piplite_install": ["the-smallest-extension"],
+            "piplite_lock": True,
+            "piplite_site_packages": True,
+            "piplite_compile": compile_pyc,
+        }
+    }
+    (an_empty_lite_dir / "jupyter_lite_config.json").write_text(json.dumps(config))
+
+    build = script_runner.run(["jupyter", "lite", "build"], cwd=str(an_empty_lite_dir))
+    assert build.success
+    not_compiled = "not compiling .pyc" in build.stderr + build.stdout
+    assert not_compiled == (compile_pyc and not expect_pyc)
+
+    output = an_empty_lite_dir / "_output"
+    lock = json.loads((output / "pypi" / PIPLITE_LOCK).read_text(**UTF8))
+    site_packages = lock["site_packages"]
+    assert "the-smallest-extension" in site_packages["packages"]
+
+    archive = output / "pypi" / site_packages["url"]
+    assert site_packages["sha256"] == get_wheel_digests(archive)[0]
+
+    with zipfile.ZipFile(archive) as zf:
+        names = zf.namelist()
+
+    dist_info = "the_smallest_extension-0.1.0.dist-info"
+    assert "the_smallest_extension/__init__.py" in names
+    assert f"{dist_info}/INSTALLER" in names
+    assert not [name for name in names if ".data/" in name]
+    assert bool([name for name in names if name.endswith(".pyc")]) == expect_pyc
+
+
 @pytest.fixture(params=[JUPYTERLITE_IPYNB, JUPYTERLITE_JSON])
 def a_lite_config_file(request, an_empty_lite_dir):
     return an_empty_lite_dir / request.param
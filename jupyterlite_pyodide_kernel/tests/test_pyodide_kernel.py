@@ -0,0 +1,341 @@
+"""Unit tests of the parts of the pyodide_kernel package which need no browser"""
+import importlib
+import json
+import sys
+import types
+
+import pytest
+
+from .conftest import HERE
+
+PYODIDE_KERNEL = (
+    HERE / "../../packages/pyodide-kernel/py/pyodide-kernel/pyodide_kernel"
+).resolve()
+
+if not PYODIDE_KERNEL.exists():  # pragma: no cover
+    pytest.skip(
+        "not in a source checkout, skipping pyodide_kernel tests",
+        allow_module_level=True,
+    )
+
+pytest.importorskip("IPython")
+
+#: an alias for the package, so its ``__init__``, which needs pyodide, is not run
+PACKAGE = "_pyodide_kernel_under_test"
+
+
+def load_module(name):
+    """import a module of pyodide_kernel, without the package ``__init__``"""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [str(PYODIDE_KERNEL)]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+class FakeClock:
+    """a ``time`` module whose ``monotonic`` only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeStream:
+    """a stream which remembers what was published"""
+
+    def __init__(self):
+        self.published = []
+
+    def publish(self, text):
+        self.published += [text]
+
+
+@pytest.fixture
+def display():
+    return load_module("display")
+
+
+@pytest.fixture
+def a_clock(display, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(display, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def a_budget(display, a_clock):
+    budget = display.LiteOutputBudget()
+    budget.notice_stream = FakeStream()
+    return budget
+
+
+def test_output_budget_max_bytes(a_budget):
+    """is output past the per-cell total dropped, with a single notice?"""
+    a_budget.max_bytes = 10
+    a_budget.rate_limit = 0
+
+    assert a_budget.allow(6)
+    assert not a_budget.allow(6)
+    assert a_budget.allow(4)
+    assert not a_budget.allow(1)
+    assert a_budget.dropped == 7
+
+    notices = a_budget.notice_stream.published
+    assert len(notices) == 1
+    assert "max_bytes" in notices[0]
+
+    a_budget.reset()
+    assert a_budget.allow(10)
+    assert a_budget.dropped == 0
+
+
+def test_output_budget_rate_window(a_budget, a_clock):
+    """is output past the rate dropped until the next window?"""
+    a_budget.max_bytes = 0
+    a_budget.rate_limit = 10
+    a_budget.rate_window = 1.0
+
+    assert a_budget.allow(8)
+    assert not a_budget.allow(8)
+
+    a_clock.now += 0.5
+    assert not a_budget.allow(8)
+
+    a_clock.now += 0.5
+    assert a_budget.allow(8)
+    assert a_budget.dropped == 16
+
+    notices = a_budget.notice_stream.published
+    assert len(notices) == 1
+    assert "rate_limit" in notices[0]
+
+
+def test_output_budget_disabled(a_budget):
+    """does a limit of 0 allow any output?"""
+    a_budget.max_bytes = 0
+    a_budget.rate_limit = 0
+
+    assert a_budget.allow(10**9)
+    assert a_budget.allow(10**9)
+    assert not a_budget.notice_stream.published
+
+
+@pytest.fixture
+def jsonutil():
+    return load_module("jsonutil")
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        None,
+        True,
+        1,
+        1.5,
+        "a",
+        [],
+        {},
+        {"a": [1, 2.5, None, {"b": "c"}]},
+        [[[["deep"]]]],
+    ],
+)
+def test_json_safe(jsonutil, obj):
+    """are objects which are already JSON returned as-is, without a copy?"""
+    assert jsonutil.is_json_safe(obj)
+    assert jsonutil.json_clean(obj) is obj
+
+
+class AnInt(int):
+    pass
+
+
+@pytest.mark.parametrize(
+    "obj,expected",
+    [
+        (float("nan"), "nan"),
+        (float("inf"), "inf"),
+        ((1, 2), [1, 2]),
+        ({1: "a"}, {"1": "a"}),
+        (AnInt(3), 3),
+        (b"\x00", "AA==\n"),
+        ({"a": [1, (2, {3})]}, {"a": [1, [2, [3]]]}),
+    ],
+)
+def test_json_unsafe(jsonutil, obj, expected):
+    """are objects which are not exactly JSON still cleaned?"""
+    assert not jsonutil.is_json_safe(obj)
+    cleaned = jsonutil.json_clean(obj)
+    assert cleaned == expected
+    assert jsonutil.is_json_safe(cleaned)
+
+
+def test_pack_data_small(display):
+    """are bundles under the threshold sent as-is?"""
+    data = {"text/plain": "hello", "application/json": {"a": [1, 2]}}
+    packed, size = display.pack_data(data, 1024)
+    assert packed is data
+    assert 0 < size < 512
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "x" * 2048,
+        {"values": list(range(1024))},
+    ],
+)
+def test_pack_data_large(display, value):
+    """are bundles over the threshold sent as a JSON string?"""
+    data = {"text/plain": "hello", "application/json": value}
+    packed, size = display.pack_data(data, 1024)
+    assert isinstance(packed, str)
+    assert json.loads(packed) == data
+    assert size > 1024
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        [float("nan")] * 1024,
+        [object()] * 1024,
+    ],
+)
+def test_pack_data_not_json(display, value):
+    """are bundles which are not strict JSON always sent as-is?"""
+    data = {"text/plain": "hello", "application/json": value}
+    packed, size = display.pack_data(data, 1024)
+    assert packed is data
+    assert size > 0
+
+
+def test_pack_data_disabled(display):
+    """does a threshold of 0 never send a JSON string?"""
+    data = {"text/plain": "x" * 2048}
+    packed, size = display.pack_data(data, 0)
+    assert packed is data
+    assert size >= 2048
+
+
+def test_estimate_size_limit(display):
+    """does estimating the size of a value stop at the limit?"""
+    assert display.estimate_size(["a", "bc"], 1024) == 7
+    assert display.estimate_size([1, 2.5, None], 1024) == 24
+    assert display.estimate_size({"a": "b"}, 1024) == 6
+    assert display.estimate_size(["x" * 100] * 1000, 10) == 102
+
+
+@pytest.fixture
+def a_publisher(display, a_clock, a_budget, monkeypatch):
+    a_budget.max_bytes = a_budget.rate_limit = 0
+    monkeypatch.setattr(display, "output_budget", a_budget)
+
+    publisher = display.LiteDisplayPublisher()
+    publisher.published = []
+    publisher.scheduled = 0
+
+    def on_update(data, metadata, transient):
+        publisher.published += [("update", data["text/plain"])]
+
+    def on_display(data, metadata, transient):
+        publisher.published += [("display", data["text/plain"])]
+
+    def schedule_flush():
+        publisher.scheduled += 1
+
+    publisher.update_display_data_callback = on_update
+    publisher.display_data_callback = on_display
+    publisher._schedule_flush = schedule_flush
+    return publisher
+
+
+def update(publisher, display_id, text):
+    publisher.publish(
+        {"text/plain": text}, transient={"display_id": display_id}, update=True
+    )
+
+
+def test_display_updates_coalesced(a_publisher, a_clock):
+    """are updates within ``update_interval`` coalesced by ``display_id``?"""
+    a_publisher.update_interval = 1.0
+
+    update(a_publisher, "a", "a1")
+    assert a_publisher.published == [("update", "a1")]
+
+    update(a_publisher, "a", "a2")
+    update(a_publisher, "b", "b1")
+    update(a_publisher, "a", "a3")
+    assert a_publisher.published == [("update", "a1")]
+    assert a_publisher.scheduled == 1
+
+    a_clock.now += 1.0
+    update(a_publisher, "b", "b2")
+    assert a_publisher.published == [
+        ("update", "a1"),
+        ("update", "a3"),
+        ("update", "b2"),
+    ]
+    assert not a_publisher._updates
+
+
+def test_display_updates_flushed(a_publisher):
+    """are pending updates published on ``flush_updates``, and before others?"""
+    a_publisher.update_interval = 1.0
+
+    update(a_publisher, "a", "a1")
+    update(a_publisher, "a", "a2")
+    a_publisher.flush_updates()
+    assert a_publisher.published == [("update", "a1"), ("update", "a2")]
+
+    update(a_publisher, "a", "a3")
+    a_publisher.publish({"text/plain": "other"})
+    assert a_publisher.published[2:] == [("update", "a3"), ("display", "other")]
+
+
+def test_display_updates_discarded(a_publisher):
+    """are pending updates dropped on ``discard_updates``?"""
+    a_publisher.update_interval = 1.0
+
+    update(a_publisher, "a", "a1")
+    update(a_publisher, "a", "a2")
+    a_publisher.discard_updates()
+    a_publisher.flush_updates()
+    assert a_publisher.published == [("update", "a1")]
+
+
+def test_display_updates_disabled(a_publisher):
+    """does an ``update_interval`` of 0 publish every update?"""
+    a_publisher.update_interval = 0
+
+    for text in ["a1", "a2", "a3"]:
+        update(a_publisher, "a", text)
+
+    assert a_publisher.published == [
+        ("update", "a1"),
+        ("update", "a2"),
+        ("update", "a3"),
+    ]
+    assert not a_publisher.scheduled
+
+
+@pytest.mark.parametrize(
+    "code,expected",
+    [
+        ("x = 1", set()),
+        ("import a", {"a"}),
+        ("import a.b, c as d", {"a", "c"}),
+        ("from e.f import g", {"e"}),
+        ("from . import h", set()),
+        ("x = 1; import i", {"i"}),
+        ("if True: import j\nelse: from k import l", {"j", "k"}),
+        ("    import m  # import n", {"m"}),
+        ("# import o\nx = 'import p'", set()),
+        ("import \\\n    q", None),
+    ],
+)
+def test_imported_names(code, expected):
+    """are the top-level names a cell may import found without parsing it?"""
+    litetransform = load_module("litetransform")
+    assert litetransform.get_imported_names(code) == expected
@@ -10,6 +10,8 @@ import {
 } from '@jupyterlite/server';
 
 import { IKernel, IKernelSpecs } from '@jupyterlite/kernel';
+
+import type { PyodideWorkerPool } from '@jupyterlite/pyodide-kernel';
 import { IBroadcastChannelWrapper } from '@jupyterlite/contents';
 
 export * as KERNEL_SETTINGS_SCHEMA from '../schema/kernel.v0.schema.json';
@@ -50,7 +52,24 @@ const kernel: JupyterLiteServerPlugin<void> = {
       : undefined;
     const rawPipUrls = config.pipliteUrls || [];
     const pipliteUrls = rawPipUrls.map((pipUrl: string) => URLExt.parse(pipUrl).href);
+    const pipliteLockUrl = config.pipliteLockUrl
+      ? URLExt.parse(config.pipliteLockUrl).href
+      : undefined;
     const disablePyPIFallback = !!config.disablePyPIFallback;
+    const pipliteWheelStoreQuota = config.pipliteWheelStoreQuota;
+    const persistSitePackages = !!config.persistSitePackages;
+    const softRestart = !!config.softRestart;
+    const poolSize = config.kernelPoolSize || 0;
+    const poolMemoryBudget = (config.kernelPoolMemoryBudget ?? 1024) * 1024 * 1024;
+    let pool: PyodideWorkerPool | null = null;
+
+    const disposePool = () => {
+      pool?.dispose();
+      pool = null;
+    };
+
+    // terminate the idle workers as soon as the page goes away
+    window.addEventListener('pagehide', disposePool);
 
     kernelspecs.register({
       spec: {
@@ -64,7 +83,9 @@ const kernel: JupyterLiteServerPlugin<void> = {
         },
       },
       create: async (options: IKernel.IOptions): Promise<IKernel> => {
-        const { PyodideKernel } = await import('@jupyterlite/pyodide-kernel');
+        const { PyodideKernel, PyodideWorkerPool } = await import(
+          '@jupyterlite/pyodide-kernel'
+        );
 
         const mountDrive = !!(serviceWorker?.enabled && broadcastChannel?.enabled);
 
@@ -74,14 +95,32 @@ const kernel: JupyterLiteServerPlugin<void> = {
           console.warn('Pyodide contents will NOT be synced with Jupyter Contents');
         }
 
-        return new PyodideKernel({
-          ...options,
+        const runtimeOptions = {
           pyodideUrl,
           pipliteWheelUrl,
           pipliteUrls,
+          pipliteLockUrl,
+          pipliteWheelStoreQuota,
+          persistSitePackages,
           disablePyPIFallback,
           mountDrive,
-        });
+          softRestart,
+        };
+
+        const kernel = new PyodideKernel({ ...options, ...runtimeOptions, pool });
+
+        // start filling the pool once the first kernel no longer needs the network
+        if (poolSize && !pool) {
+          kernel.ready.then(() => {
+            pool ??= new PyodideWorkerPool({
+              size: poolSize,
+              memoryBudget: poolMemoryBudget,
+              remoteOptions: PyodideKernel.getRemoteOptions(runtimeOptions, ''),
+            });
+          });
+        }
+
+        return kernel;
       },
     });
   },
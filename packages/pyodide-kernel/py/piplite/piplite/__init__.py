@@ -1,6 +1,12 @@
 """A configurable Python package backed by Pyodide's micropip"""
-from .piplite import install
+from .piplite import clear_wheel_store, get_wheel_store, install, prefetch_indices
 
 __version__ = "0.2.0"
 
-__all__ = ["install", "__version__"]
+__all__ = [
+    "clear_wheel_store",
+    "get_wheel_store",
+    "install",
+    "prefetch_indices",
+    "__version__",
+]
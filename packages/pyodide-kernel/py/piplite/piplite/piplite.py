@@ -6,16 +6,27 @@
     `pyodide-kernel` also includes a browser shim for the IPython `%pip` magic
 
 """
+from io import BytesIO
 from typing import Any
 import asyncio
+import hashlib
+import importlib
+import importlib.metadata
 import json
 import logging
+import re
+import sysconfig
+import time
 from unittest.mock import patch
+from urllib.parse import urljoin
 
 import micropip
 from micropip.package_index import ProjectInfo
 from micropip.package_index import query_package as _MP_QUERY_PACKAGE
 from micropip.package_index import fetch_string_and_headers as _MP_FETCH_STRING
+from micropip.transaction import WheelInfo
+
+_MP_FETCH_WHEEL = WheelInfo._fetch_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -26,12 +37,59 @@ _PIPLITE_URLS = []
 #: a cache of available packages
 _PIPLITE_INDICES = {}
 
+#: in-flight loads of indices, by URL
+_PIPLITE_INDEX_LOADS = {}
+
+#: the warm-up of all indices started by the kernel, if any
+_PIPLITE_PREFETCH = None
+
+#: a cache of the releases of single projects from sharded indices
+_PIPLITE_SHARDS = {}
+
+#: a cache of ``ProjectInfo`` (or ``None`` if not found) by (URL, normalized name)
+_PIPLITE_PROJECTS = {}
+
+#: the ``_PIPLITE_URLS`` for which ``_PIPLITE_PROJECTS`` is valid
+_PIPLITE_PROJECTS_URLS = []
+
 #: don't fall back to pypi.org if a package is not found in _PIPLITE_URLS
 _PIPLITE_DISABLE_PYPI = False
 
+#: the most bytes of downloaded wheels to keep across page loads, or 0 to keep none
+_PIPLITE_WHEEL_STORE_QUOTA = 512 * 1024 * 1024
+
+#: the name of the browser Cache Storage of downloaded wheels
+_PIPLITE_WHEEL_STORE = "piplite-wheels-v0"
+
+#: serializes changes to when each stored wheel was last used, as micropip fetches
+#: wheels concurrently
+_PIPLITE_WHEEL_STORE_LOCK = asyncio.Lock()
+
+#: the number of times site-packages may have changed, to know when to persist it
+_PIPLITE_INSTALLS = 0
+
+#: an async callable to add what other kernels persisted to site-packages, before
+#: installing
+_PIPLITE_SYNC_SITE_PACKAGES = None
+
 #: a well-known file name respected by the rest of the build chain
 ALL_JSON = "/all.json"
 
+#: the manifest of project names in a sharded index, next to its all.json
+PROJECTS_JSON = "/projects.json"
+
+#: the folder of per-project JSON in a sharded index
+PROJECTS_SHARDS = "projects"
+
+#: the path of stored wheels, by sha256, in the wheel store
+WHEEL_STORE_PREFIX = "/piplite/wheels/"
+
+#: the path of when each stored wheel was last used, in the wheel store
+WHEEL_STORE_USED = "/piplite/wheels-used.json"
+
+#: a sha256 hex digest
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
 
 class PiplitePyPIDisabled(ValueError):
     """An error for when PyPI is disabled at the site level, but a download was
@@ -40,40 +98,158 @@ class PiplitePyPIDisabled(ValueError):
     pass
 
 
+class _PipliteIndexUnavailable(Exception):
+    """An error for when an index could not be loaded, so a missing package should
+    not be remembered as missing."""
+
+    pass
+
+
+def _normalize_name(name: str) -> str:
+    """Get the PEP 503 normalized name of a package."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _invalidate_caches() -> None:
+    """Forget all found (and not found) packages, e.g. after ``_PIPLITE_URLS``
+    changes."""
+    _PIPLITE_PROJECTS.clear()
+    _PIPLITE_PROJECTS_URLS[:] = _PIPLITE_URLS
+
+
+async def _fetch_index(piplite_url, fetch_kwargs) -> dict:
+    """Fetch and parse an ``all.json`` or ``projects.json``, and cache it."""
+    try:
+        data, headers = await _MP_FETCH_STRING(piplite_url, fetch_kwargs)
+    except Exception as err:
+        logger.warn("Could not fetch %s: %s", piplite_url, err)
+        raise _PipliteIndexUnavailable(piplite_url) from err
+
+    try:
+        index = json.loads(data)
+    except Exception as err:
+        logger.warn("Could not parse %s: %s", piplite_url, err)
+        raise _PipliteIndexUnavailable(piplite_url) from err
+
+    _PIPLITE_INDICES.update({piplite_url: index})
+    return index
+
+
+async def _load_index(piplite_url, fetch_kwargs) -> dict:
+    """Get a cached index, or wait for the one (possibly already started) load."""
+    if piplite_url in _PIPLITE_INDICES:
+        return _PIPLITE_INDICES[piplite_url]
+
+    load = _PIPLITE_INDEX_LOADS.get(piplite_url)
+
+    if load is None:
+        load = asyncio.ensure_future(_fetch_index(piplite_url, fetch_kwargs))
+        _PIPLITE_INDEX_LOADS[piplite_url] = load
+
+    try:
+        return await load
+    finally:
+        # a failed load will be retried by the next query
+        _PIPLITE_INDEX_LOADS.pop(piplite_url, None)
+
+
+async def prefetch_indices(fetch_kwargs: dict[str, Any] | None = None) -> dict:
+    """Concurrently fetch and parse all of the configured piplite indices.
+
+    Returns the seconds spent loading each index, by URL: as they are loaded at
+    the same time, the sum of these minus the largest is the time saved over
+    loading them one after another.
+    """
+    fetch_kwargs = fetch_kwargs or {}
+
+    async def _timed_load(piplite_url):
+        start = time.perf_counter()
+        try:
+            await _load_index(piplite_url, fetch_kwargs)
+        except _PipliteIndexUnavailable:
+            pass
+        return piplite_url, time.perf_counter() - start
+
+    piplite_urls = [url for url in _PIPLITE_URLS if _get_pypi_json_getter(url)]
+    return dict(await asyncio.gather(*map(_timed_load, piplite_urls)))
+
+
+def _get_pypi_json_getter(piplite_url):
+    """Get the function that finds a package in a kind of index, if supported."""
+    bare_url = piplite_url.split("?")[0].split("#")[0]
+
+    if bare_url.endswith(ALL_JSON):
+        return _get_pypi_json_from_index
+    elif bare_url.endswith(PROJECTS_JSON):
+        return _get_pypi_json_from_shards
+
+
 async def _get_pypi_json_from_index(name, piplite_url, fetch_kwargs) -> ProjectInfo:
     """Attempt to load a specific ``pkgname``'s releases from a specific piplite
     URL's index.
     """
-    index = _PIPLITE_INDICES.get(piplite_url, {})
+    index = await _load_index(piplite_url, fetch_kwargs)
 
-    if not index:
-        try:
-            data, headers = await _MP_FETCH_STRING(piplite_url, fetch_kwargs)
-        except Exception as err:
-            logger.warn("Could not fetch %s: %s", piplite_url, err)
+    pkg = dict(index.get(name) or index.get(_normalize_name(name)) or {})
+
+    if not pkg:
+        return None
+
+    return _get_project_info(name, pkg, piplite_url.split(ALL_JSON)[0])
+
+
+async def _get_pypi_json_from_shards(name, piplite_url, fetch_kwargs) -> ProjectInfo:
+    """Attempt to load a specific ``pkgname``'s releases from a sharded index,
+    fetching only the manifest and the JSON of that one project.
+    """
+    manifest = await _load_index(piplite_url, fetch_kwargs)
+
+    normalized_name = _normalize_name(name)
+    shard_sha256 = manifest.get("projects", {}).get(normalized_name)
+
+    if not shard_sha256:
+        return None
+
+    base_url = piplite_url.split(PROJECTS_JSON)[0]
+    shard_url = (
+        f"{base_url}/{PROJECTS_SHARDS}/{normalized_name}.json?sha256={shard_sha256}"
+    )
+    pkg = _PIPLITE_SHARDS.get(shard_url)
 
+    if pkg is None:
         try:
-            index = json.loads(data)
-            _PIPLITE_INDICES.update({piplite_url: index})
+            data, headers = await _MP_FETCH_STRING(shard_url, fetch_kwargs)
+            pkg = json.loads(data)
+            _PIPLITE_SHARDS.update({shard_url: pkg})
         except Exception as err:
-            logger.warn("Could not parse %s: %s", piplite_url, err)
+            logger.warn("Could not load %s: %s", shard_url, err)
+            raise _PipliteIndexUnavailable(shard_url) from err
 
-    pkg = dict((index or {}).get(name) or {})
+    return _get_project_info(name, dict(pkg), base_url)
 
-    if not pkg:
-        return None
+
+def _get_project_info(name, pkg, base_url) -> ProjectInfo:
+    """Get the compatible releases of a project, with local paths made absolute."""
+    pkg["releases"] = {
+        version: [dict(artifact) for artifact in release]
+        for version, release in pkg["releases"].items()
+    }
 
     # rewrite local paths
     for release in pkg["releases"].values():
         for artifact in release:
             if artifact["url"].startswith("."):
                 artifact["url"] = (
-                    f"""{piplite_url.split(ALL_JSON)[0]}/{artifact["url"]}"""
+                    f"""{base_url}/{artifact["url"]}"""
                     f"""?sha256={artifact["digests"]["sha256"]}"""
                 )
 
     info = ProjectInfo._compatible_only(name, pkg["releases"])
-    return info
+    # keep the (lazily-checked) compatible wheels, so the info can be reused
+    return ProjectInfo(
+        name=info.name,
+        releases={version: [*wheels] for version, wheels in info.releases.items()},
+    )
 
 
 async def _query_package(
@@ -82,14 +258,31 @@ async def _query_package(
     index_urls: list[str] | str | None = None,
 ) -> ProjectInfo:
     """Fetch the warehouse API metadata for a specific ``pkgname``."""
+    if _PIPLITE_PROJECTS_URLS != _PIPLITE_URLS:
+        _invalidate_caches()
+
+    normalized_name = _normalize_name(name)
+
     for piplite_url in _PIPLITE_URLS:
-        if not piplite_url.split("?")[0].split("#")[0].endswith(ALL_JSON):
+        get_pypi_json = _get_pypi_json_getter(piplite_url)
+
+        if get_pypi_json is None:
             logger.warn("Non-all.json piplite URL not supported %s", piplite_url)
             continue
 
-        pypi_json_from_index = await _get_pypi_json_from_index(
-            name, piplite_url, fetch_kwargs
-        )
+        cache_key = piplite_url, normalized_name
+
+        if cache_key in _PIPLITE_PROJECTS:
+            pypi_json_from_index = _PIPLITE_PROJECTS[cache_key]
+        else:
+            try:
+                pypi_json_from_index = await get_pypi_json(
+                    name, piplite_url, fetch_kwargs
+                )
+            except _PipliteIndexUnavailable:
+                continue
+            _PIPLITE_PROJECTS[cache_key] = pypi_json_from_index
+
         if pypi_json_from_index:
             return pypi_json_from_index
 
@@ -101,6 +294,183 @@ async def _query_package(
     return await _MP_QUERY_PACKAGE(name, fetch_kwargs, index_urls)
 
 
+async def _open_wheel_store():
+    """Get the Cache Storage of downloaded wheels, if enabled and available."""
+    if not _PIPLITE_WHEEL_STORE_QUOTA:
+        return None
+
+    try:
+        from js import caches
+
+        return await caches.open(_PIPLITE_WHEEL_STORE)
+    except Exception as err:
+        logger.debug("Wheel store is not available: %s", err)
+        return None
+
+
+async def _load_wheels_used(store) -> dict[str, float]:
+    """Get when each stored wheel was last used, by sha256."""
+    response = await store.match(WHEEL_STORE_USED)
+
+    if response is None:
+        return {}
+
+    try:
+        return json.loads(await response.text())
+    except Exception:
+        return {}
+
+
+async def _save_wheels_used(store, used: dict[str, float]) -> None:
+    """Record when each stored wheel was last used, by sha256."""
+    from js import Response
+
+    await store.put(WHEEL_STORE_USED, Response.new(json.dumps(used)))
+
+
+async def _get_stored_wheels(store) -> dict[str, dict[str, Any]]:
+    """Get the file name and size of each stored wheel, by sha256."""
+    wheels = {}
+
+    for request in await store.keys():
+        sha256 = request.url.rsplit("/", 1)[-1]
+        if not SHA256_PATTERN.fullmatch(sha256):
+            continue
+        response = await store.match(request)
+        if response is None:
+            continue
+        wheels[sha256] = {
+            "filename": response.headers.get("x-piplite-wheel"),
+            "size": int(response.headers.get("content-length") or 0),
+        }
+
+    return wheels
+
+
+async def _evict_wheels(store, used: dict[str, float]) -> None:
+    """Remove the least recently used wheels until the store is within its quota."""
+    wheels = await _get_stored_wheels(store)
+    total = sum(wheel["size"] for wheel in wheels.values())
+
+    for sha256 in sorted(wheels, key=lambda sha256: used.get(sha256, 0)):
+        if total <= _PIPLITE_WHEEL_STORE_QUOTA:
+            break
+        await store.delete(f"{WHEEL_STORE_PREFIX}{sha256}")
+        total -= wheels[sha256]["size"]
+        used.pop(sha256, None)
+
+
+async def _get_stored_wheel(store, sha256: str) -> bytes | None:
+    """Get a stored wheel by its sha256, marking it as used."""
+    response = await store.match(f"{WHEEL_STORE_PREFIX}{sha256}")
+
+    if response is None:
+        return None
+
+    data = (await response.arrayBuffer()).to_bytes()
+
+    if hashlib.sha256(data).hexdigest() != sha256:
+        await store.delete(f"{WHEEL_STORE_PREFIX}{sha256}")
+        return None
+
+    async with _PIPLITE_WHEEL_STORE_LOCK:
+        used = await _load_wheels_used(store)
+        used[sha256] = time.time()
+        await _save_wheels_used(store, used)
+
+    return data
+
+
+async def _store_wheel(store, sha256: str, filename: str, data: bytes) -> None:
+    """Keep a downloaded wheel by its sha256, evicting others to stay in quota."""
+    from js import Object, Response
+    from pyodide.ffi import to_js
+
+    if hashlib.sha256(data).hexdigest() != sha256:
+        return
+
+    if len(data) > _PIPLITE_WHEEL_STORE_QUOTA:
+        return
+
+    headers = {"content-length": str(len(data)), "x-piplite-wheel": filename}
+    init = to_js({"headers": headers}, dict_converter=Object.fromEntries)
+    await store.put(f"{WHEEL_STORE_PREFIX}{sha256}", Response.new(to_js(data), init))
+
+    async with _PIPLITE_WHEEL_STORE_LOCK:
+        used = await _load_wheels_used(store)
+        used[sha256] = time.time()
+        await _evict_wheels(store, used)
+        await _save_wheels_used(store, used)
+
+
+async def _fetch_wheel(self: WheelInfo, fetch_kwargs):
+    """Get a wheel from the wheel store by its sha256, or download and store it.
+
+    The store is only a cache: any problem with it falls back to downloading.
+    """
+    sha256 = self.sha256
+
+    if sha256 is None:
+        match = re.search(r"[?&]sha256=([0-9a-f]{64})", self.url)
+        sha256 = match and match[1]
+
+    store = await _open_wheel_store() if sha256 else None
+
+    if store is not None:
+        try:
+            data = await _get_stored_wheel(store, sha256)
+            if data is not None:
+                return BytesIO(data)
+        except Exception as err:
+            logger.warn("Could not read %s from the wheel store: %s", sha256, err)
+
+    data = await _MP_FETCH_WHEEL(self, fetch_kwargs)
+
+    if store is not None and isinstance(data, BytesIO):
+        try:
+            await _store_wheel(store, sha256, self.filename, data.getvalue())
+        except Exception as err:
+            logger.warn("Could not add %s to the wheel store: %s", self.filename, err)
+
+    return data
+
+
+async def get_wheel_store() -> dict[str, Any]:
+    """Describe the wheels kept across page loads, most recently used first.
+
+    Wheels are kept by their sha256 in the browser's Cache Storage, and reused
+    instead of downloading them again. The least recently used are removed once
+    they take up more than the quota.
+    """
+    store = await _open_wheel_store()
+    wheels = {} if store is None else await _get_stored_wheels(store)
+    used = {} if store is None else await _load_wheels_used(store)
+
+    return {
+        "quota": _PIPLITE_WHEEL_STORE_QUOTA,
+        "size": sum(wheel["size"] for wheel in wheels.values()),
+        "wheels": sorted(
+            (
+                {"sha256": sha256, **wheel, "used": used.get(sha256)}
+                for sha256, wheel in wheels.items()
+            ),
+            key=lambda wheel: wheel["used"] or 0,
+            reverse=True,
+        ),
+    }
+
+
+async def clear_wheel_store() -> bool:
+    """Remove all of the wheels kept across page loads."""
+    try:
+        from js import caches
+
+        return bool(await caches.delete(_PIPLITE_WHEEL_STORE))
+    except Exception as err:
+        logger.warn("Could not clear the wheel store: %s", err)
+        return False
+
+
 async def _install(
     requirements: str | list[str],
     keep_going: bool = False,
@@ -112,17 +482,128 @@ async def _install(
     verbose: bool | int = False,
 ):
     """Invoke micropip.install with a patch to get data from local indexes"""
-    with patch("micropip.package_index.query_package", _query_package):
-        return await micropip.install(
-            requirements=requirements,
-            keep_going=keep_going,
-            deps=deps,
-            credentials=credentials,
-            pre=pre,
-            index_urls=index_urls,
-            verbose=verbose,
+    global _PIPLITE_INSTALLS
+
+    if _PIPLITE_SYNC_SITE_PACKAGES is not None:
+        try:
+            await _PIPLITE_SYNC_SITE_PACKAGES()
+            importlib.invalidate_caches()
+        except Exception as err:
+            logger.warn("Could not add the persisted site-packages: %s", err)
+
+    with patch("micropip.package_index.query_package", _query_package), patch.object(
+        WheelInfo, "_fetch_bytes", _fetch_wheel
+    ):
+        try:
+            return await micropip.install(
+                requirements=requirements,
+                keep_going=keep_going,
+                deps=deps,
+                credentials=credentials,
+                pre=pre,
+                index_urls=index_urls,
+                verbose=verbose,
+            )
+        finally:
+            _PIPLITE_INSTALLS += 1
+
+
+def _is_lock_stale(lock: dict) -> bool:
+    """Whether a lock was made from indices other than those in ``_PIPLITE_URLS``."""
+    known = {
+        sha256
+        for piplite_url in _PIPLITE_URLS
+        for sha256 in re.findall(r"sha256=([0-9a-f]+)", piplite_url)
+    }
+    return not set(lock.get("indices", {}).values()) <= known
+
+
+def _is_installed(package: dict) -> bool:
+    """Whether the locked version of a package is already installed."""
+    try:
+        return importlib.metadata.version(package["name"]) == package["version"]
+    except importlib.metadata.PackageNotFoundError:
+        return False
+
+
+async def _unpack_site_packages(
+    archive_url: str, fetch_kwargs: dict[str, Any] | None = None
+) -> bool:
+    """Extract a build-time archive of already-installed wheels into site-packages."""
+    global _PIPLITE_INSTALLS
+    from pyodide.http import pyfetch
+
+    try:
+        response = await pyfetch(archive_url, **(fetch_kwargs or {}))
+        await response.unpack_archive(
+            extract_dir=sysconfig.get_path("purelib"), format="zip"
+        )
+    except Exception as err:
+        logger.warn("Could not unpack %s: %s", archive_url, err)
+        return False
+
+    _PIPLITE_INSTALLS += 1
+    importlib.invalidate_caches()
+    return True
+
+
+async def _install_from_lock(
+    lock_url: str,
+    requirements: list[str],
+    fetch_kwargs: dict[str, Any] | None = None,
+) -> None:
+    """Install ``requirements``, and those of a build-time lock, skipping resolution.
+
+    The lock lists exact wheels in install order, which are fetched concurrently and
+    installed without their dependencies. If the lock can't be loaded, or was made
+    from other indices than ``_PIPLITE_URLS``, everything is resolved as usual, as
+    are any requirements the lock does not describe.
+
+    If the lock includes an archive of its wheels as installed, it is extracted
+    first, and only the packages it didn't provide are installed. Locked wheels are
+    fetched with their ``sha256``, so they may come from the wheel store.
+    """
+    lock = {}
+
+    try:
+        data, headers = await _MP_FETCH_STRING(lock_url, fetch_kwargs or {})
+        lock = json.loads(data)
+    except Exception as err:
+        logger.warn("Could not load %s: %s", lock_url, err)
+
+    locked = lock.get("requirements", [])
+    requirements = [*requirements, *(req for req in locked if req not in requirements)]
+
+    if not lock or _is_lock_stale(lock):
+        if lock:
+            logger.warn("%s is stale: resolving %s", lock_url, requirements)
+        await install(requirements, keep_going=True)
+        return
+
+    site_packages = lock.get("site_packages")
+
+    if site_packages:
+        archive_url = urljoin(lock_url, site_packages["url"])
+        await _unpack_site_packages(
+            f"""{archive_url}?sha256={site_packages["sha256"]}""", fetch_kwargs
         )
 
+    wheel_urls = [
+        f"""{urljoin(lock_url, package["url"])}?sha256={package["sha256"]}"""
+        for package in lock["packages"]
+        if not _is_installed(package)
+    ]
+    unresolved = [
+        *lock.get("unresolved", []),
+        *(req for req in requirements if req not in locked),
+    ]
+
+    if wheel_urls:
+        await install(wheel_urls, keep_going=True, deps=False)
+
+    if unresolved:
+        await install(unresolved, keep_going=True)
+
 
 def install(
     requirements: str | list[str],
@@ -235,4 +716,4 @@ def install(
     )
 
 
-__all__ = ["install"]
+__all__ = ["clear_wheel_store", "get_wheel_store", "install", "prefetch_indices"]
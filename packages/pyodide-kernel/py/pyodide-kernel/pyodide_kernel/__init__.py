@@ -17,11 +17,12 @@ patches.apply_patches()
 del patches
 
 # 2. set up the rest of the IPython-like environment
-from .display import LiteStream
+from .display import LiteStream, output_budget
 from .interpreter import LitePythonShellApp
 
 stdout_stream = LiteStream("stdout")
 stderr_stream = LiteStream("stderr")
+output_budget.notice_stream = stderr_stream
 
 ipython_shell_app = LitePythonShellApp()
 ipython_shell_app.initialize()
@@ -12,7 +12,7 @@ class Comm(BaseComm):
         content = dict(data=data, comm_id=self.comm_id, **keys)
 
         if buffers is not None:
-            buffers = [(b.tobytes() if hasattr(b, "tobytes") else b) for b in buffers]
+            buffers = [_to_memoryview(b) for b in buffers]
 
         get_ipython().send_comm(
             msg_type,
@@ -23,4 +23,15 @@ class Comm(BaseComm):
         )
 
 
+def _to_memoryview(buffer):
+    """Get a flat view of a buffer, to be copied (once) to a transferable JS buffer
+
+    Only buffers which are not contiguous, e.g. a slice of a numpy array, are copied.
+    """
+    view = memoryview(buffer)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    return view.cast("B") if view.format != "B" or view.ndim != 1 else view
+
+
 comm.create_comm = Comm
@@ -1,4 +1,7 @@
+import asyncio
+import json
 import sys
+import time
 
 from IPython.core.displayhook import DisplayHook
 from IPython.core.displaypub import DisplayPublisher
@@ -6,33 +9,292 @@ from IPython.display import Image  # to replace previous base64-encoding shim
 
 from .jsonutil import encode_images, json_clean
 
-__all__ = ["LiteStream", "Image", "LiteDisplayHook", "LiteDisplayPublisher"]
+__all__ = [
+    "LiteOutputBudget",
+    "LiteStream",
+    "Image",
+    "LiteDisplayHook",
+    "LiteDisplayPublisher",
+    "estimate_size",
+    "output_budget",
+    "pack_data",
+]
+
+
+def estimate_size(value, limit):
+    """Cheaply estimate the size of a display data value as JSON, in bytes
+
+    Strings count their length, and other scalars a few bytes. Containers are only
+    walked until the estimate reaches ``limit``.
+    """
+    size = 0
+    stack = [value]
+
+    while stack and size < limit:
+        value = stack.pop()
+        if isinstance(value, (str, bytes)):
+            size += len(value) + 2
+        elif isinstance(value, dict):
+            stack.extend(value)
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        else:
+            size += 8
+
+    return size
+
+
+def pack_data(data, threshold):
+    """Get a display data bundle to send to the worker, and its size in bytes
+
+    Bundles over ``threshold`` bytes are sent as a single JSON string, which the
+    worker parses at once, rather than as a proxy it converts value by value. Each
+    value is only serialized if the bundle's estimated size is near ``threshold``,
+    and then only once, for both its size and the string. Bundles which cannot be
+    serialized as strict JSON are always sent as-is.
+    """
+    if not threshold:
+        return data, LiteOutputBudget.get_size(data)
+
+    estimate = 0
+
+    for value in data.values():
+        if isinstance(value, (str, bytes)):
+            estimate += len(value)
+        else:
+            estimate += estimate_size(value, threshold)
+
+    if estimate < threshold // 2:
+        return data, estimate
+
+    encoded = {}
+    size = 0
+
+    for key, value in data.items():
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+            continue
+        try:
+            encoded[key] = json.dumps(value, allow_nan=False)
+        except (TypeError, ValueError):
+            return data, LiteOutputBudget.get_size(data)
+        size += len(encoded[key])
+
+    if size <= threshold:
+        return data, size
+
+    if not all(
+        type(key) is str and type(value) is not bytes for key, value in data.items()
+    ):
+        return data, size
+
+    items = (
+        f"{json.dumps(key)}:{encoded[key] if key in encoded else json.dumps(value)}"
+        for key, value in data.items()
+    )
+    return "{" + ",".join(items) + "}", size
+
+
+class LiteOutputBudget:
+    """The limits on how much output a single cell may publish
+
+    ``max_bytes`` is the total for the cell, and ``rate_limit`` the bytes per
+    second over windows of ``rate_window`` seconds, like Jupyter Server's
+    ``iopub_data_rate_limit``. Past the total, the rest of the cell's output is
+    dropped: past the rate, output is dropped until the next window. Either way, a
+    single notice is published on ``notice_stream``. A limit of ``0`` disables it.
+    """
+
+    max_bytes = 32 * 1024 * 1024
+
+    rate_limit = 1_000_000
+
+    rate_window = 3.0
+
+    def __init__(self):
+        self.notice_stream = None
+        self.reset()
+
+    def reset(self):
+        """Start counting the output of a new cell"""
+        self.dropped = 0
+        self._total = 0
+        self._window = 0
+        self._window_start = time.monotonic()
+        self._noticed = False
+
+    def allow(self, size):
+        """Whether output of ``size`` bytes may be published, counting it if so"""
+        now = time.monotonic()
+        window_limit = self.rate_limit * self.rate_window
+
+        if now - self._window_start >= self.rate_window:
+            self._window = 0
+            self._window_start = now
+
+        if self.max_bytes and self._total + size > self.max_bytes:
+            limit = f"limit of {self.max_bytes} bytes per cell (max_bytes)"
+        elif window_limit and self._window + size > window_limit:
+            limit = f"rate limit of {self.rate_limit} bytes/sec (rate_limit)"
+        else:
+            self._total += size
+            self._window += size
+            return True
+
+        self.dropped += size
+
+        if not self._noticed:
+            self._noticed = True
+            self.publish_notice(limit)
+
+        return False
+
+    def publish_notice(self, limit):
+        """Tell the user, once, that output is being dropped"""
+        if self.notice_stream is None:
+            return
+        self.notice_stream.publish(
+            f"Output truncated: this cell exceeded the output {limit}.\n"
+            "To change the limits, update `pyodide_kernel.output_budget`.\n"
+        )
+
+    @staticmethod
+    def get_size(data):
+        """Get the approximate size of a display data bundle, in bytes"""
+        size = 0
+        for value in data.values():
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+            else:
+                size += len(json.dumps(value, default=str))
+        return size
 
 
 class LiteStream:
+    """A file-like stream which publishes its text in batches
+
+    The first write after ``flush_interval`` seconds without publishing is published
+    right away. Text written sooner is buffered, and published when
+    ``max_buffer_size`` characters are buffered, when the first buffered text is
+    ``flush_interval`` seconds old, on ``flush``, and at the end of each cell. At most
+    one stream has buffered text at a time: it is flushed before any other stream
+    writes, keeping the order of ``stdout`` and ``stderr``.
+    """
+
     encoding = "utf-8"
 
-    def __init__(self, name):
+    #: the number of buffered characters to publish right away
+    max_buffer_size = 64 * 1024
+
+    #: the seconds after which buffered text is published
+    flush_interval = 0.2
+
+    #: the stream with buffered text, if any
+    _pending = None
+
+    def __init__(self, name, max_buffer_size=None, flush_interval=None):
         self.name = name
         self.publish_stream_callback = None
+        if max_buffer_size is not None:
+            self.max_buffer_size = max_buffer_size
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        self._buffer = []
+        self._buffer_size = 0
+        self._buffer_started = None
+        self._last_flush = float("-inf")
+
+    @classmethod
+    def flush_pending(cls):
+        """Publish the text of whichever stream has any buffered"""
+        if cls._pending is not None:
+            cls._pending.flush()
 
     def write(self, text):
+        if not (self.publish_stream_callback and text):
+            return
+
+        if LiteStream._pending is not self:
+            LiteStream.flush_pending()
+            LiteStream._pending = self
+
+        now = time.monotonic()
+
+        if not self._buffer:
+            self._buffer_started = now
+
+        self._buffer.append(text)
+        self._buffer_size += len(text)
+
+        if (
+            self._buffer_size >= self.max_buffer_size
+            or now - self._buffer_started >= self.flush_interval
+            or now - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+        elif len(self._buffer) == 1:
+            self._schedule_flush()
+
+    def flush(self):
+        if LiteStream._pending is self:
+            LiteStream._pending = None
+
+        if not self._buffer:
+            return
+
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffer_size = 0
+        self._buffer_started = None
+        self._last_flush = time.monotonic()
+
+        if output_budget.allow(len(text.encode("utf-8", "replace"))):
+            self.publish(text)
+
+    def publish(self, text):
+        """Publish text right away, without buffering or counting it"""
         if self.publish_stream_callback:
             self.publish_stream_callback(self.name, text)
 
-    def flush(self):
-        pass
+    def _schedule_flush(self):
+        """Publish buffered text after ``flush_interval``, if the cell yields first"""
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return
+        loop.call_later(self.flush_interval, self.flush)
 
     def isatty(self):
         return False
 
 
 class LiteDisplayPublisher(DisplayPublisher):
+    """A display publisher which coalesces updates to the same display
+
+    The first ``update_display_data`` after ``update_interval`` seconds without one
+    is published right away. Within each ``update_interval`` after that, only the
+    latest update for each ``display_id`` is published. Pending updates are
+    published before any other display data or ``clear_output``, on
+    ``flush_updates``, and at the end of each cell. An ``update_interval`` of ``0``
+    publishes every update.
+    """
+
+    #: the size in bytes over which display data is sent as a JSON string, or 0
+    json_threshold = 64 * 1024
+
+    #: the seconds over which updates to the same display are coalesced
+    update_interval = 1 / 60
+
     def __init__(self, shell=None, *args, **kwargs):
         super(LiteDisplayPublisher, self).__init__(shell, *args, **kwargs)
         self.clear_output_callback = None
         self.update_display_data_callback = None
         self.display_data_callback = None
+        self._updates = {}
+        self._updates_started = None
+        self._updates_flushed = float("-inf")
+        self._updates_timer = None
 
     def publish(
         self,
@@ -44,17 +306,85 @@ class LiteDisplayPublisher(DisplayPublisher):
         update=False,
         **kwargs,
     ) -> None:
+        LiteStream.flush_pending()
+
+        display_id = (transient or {}).get("display_id")
+
+        if update and display_id is not None and self.update_interval:
+            self._queue_update(display_id, data, metadata, transient)
+            return
+
+        self.flush_updates()
+        self._publish(data, metadata, transient, update)
+
+    def flush_updates(self):
+        """Publish the latest pending update of each display"""
+        updates = list(self._updates.values())
+        self.discard_updates()
+
+        if updates:
+            self._updates_flushed = time.monotonic()
+
+        for data, metadata, transient in updates:
+            self._publish(data, metadata, transient, True)
+
+    def discard_updates(self):
+        """Forget pending updates without publishing them, e.g. on a restart"""
+        self._updates.clear()
+        self._updates_started = None
+
+        if self._updates_timer is not None:
+            self._updates_timer.cancel()
+            self._updates_timer = None
+
+    def _queue_update(self, display_id, data, metadata, transient):
+        """Keep only the latest update of a display, until ``update_interval``"""
+        now = time.monotonic()
+
+        if not self._updates and now - self._updates_flushed >= self.update_interval:
+            self._updates_flushed = now
+            self._publish(data, metadata, transient, True)
+            return
+
+        self._updates[display_id] = (data, metadata, transient)
+
+        if self._updates_started is None:
+            self._updates_started = now
+            self._schedule_flush()
+        elif now - self._updates_started >= self.update_interval:
+            self.flush_updates()
+
+    def _schedule_flush(self):
+        """Publish pending updates after ``update_interval``, if the cell yields"""
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return
+        self._updates_timer = loop.call_later(self.update_interval, self.flush_updates)
+
+    def _publish(self, data, metadata, transient, update):
+        data, size = pack_data(data, self.json_threshold)
+
+        if not output_budget.allow(size):
+            return
+
         if update and self.update_display_data_callback:
             self.update_display_data_callback(data, metadata, transient)
         elif self.display_data_callback:
             self.display_data_callback(data, metadata, transient)
 
     def clear_output(self, wait=False):
+        LiteStream.flush_pending()
+        self.flush_updates()
+
         if self.clear_output_callback:
             self.clear_output_callback(wait)
 
 
 class LiteDisplayHook(DisplayHook):
+    #: the size in bytes over which a result is sent as a JSON string, or 0
+    json_threshold = 64 * 1024
+
     def __init__(self, *args, **kwargs):
         super(LiteDisplayHook, self).__init__(*args, **kwargs)
         self.publish_execution_result = None
@@ -75,7 +405,13 @@ class LiteDisplayHook(DisplayHook):
         sys.stderr.flush()
 
         if self.publish_execution_result:
-            self.publish_execution_result(self.prompt_count, self.data, self.metadata)
+            data, size = pack_data(self.data, self.json_threshold)
+            if output_budget.allow(size):
+                self.publish_execution_result(self.prompt_count, data, self.metadata)
 
         self.data = {}
         self.metadata = {}
+
+
+#: the output limits of the current cell
+output_budget = LiteOutputBudget()
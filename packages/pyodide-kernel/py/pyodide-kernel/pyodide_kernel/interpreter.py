@@ -8,7 +8,7 @@ from IPython.core.history import HistoryManager
 from IPython.core.interactiveshell import InteractiveShell
 from IPython.core.shellapp import InteractiveShellApp
 
-from .display import LiteDisplayHook, LiteDisplayPublisher
+from .display import LiteDisplayHook, LiteDisplayPublisher, LiteStream
 from .kernel import PyodideKernel
 
 __all__ = ["Interpreter"]
@@ -38,6 +38,7 @@ class Interpreter(InteractiveShell):
         #added
         _default_input = builtins.input
         def _patched_input(prompt=None):
+            self.flush_output()
             if prompt is not None:
                 print(prompt, end='', flush=True)
                 res = js.prompt(prompt)
@@ -63,7 +64,17 @@ class Interpreter(InteractiveShell):
     @getpass.setter
     def getpass(self, value):
         self._getpass = value
-        getpass.getpass = self._getpass
+
+        def _flushed_getpass(*args, **kwargs):
+            self.flush_output()
+            return value(*args, **kwargs)
+
+        getpass.getpass = _flushed_getpass
+
+    def flush_output(self):
+        """Publish any buffered output, e.g. before asking for input"""
+        LiteStream.flush_pending()
+        self.display_pub.flush_updates()
 
     def init_history(self):
         self.history_manager = CustomHistoryManager(shell=self, parent=self)
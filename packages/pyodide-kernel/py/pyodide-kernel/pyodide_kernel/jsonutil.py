@@ -50,6 +50,9 @@ PDF64 = b"JVBER"
 # lite: we do not know this
 # JUPYTER_CLIENT_MAJOR_VERSION = jupyter_client_version[0]
 
+# lite: the exact types which are already json-safe, without needing a copy
+JSON_ATOMIC_TYPES = {str, int, bool, type(None)}
+
 
 def encode_images(format_dict):
     """b64-encodes images in a displaypub format dict
@@ -76,6 +79,31 @@ def encode_images(format_dict):
     return format_dict
 
 
+def is_json_safe(obj):
+    """Check, in a single pass, whether an object is already safe to encode in JSON.
+
+    Only the exact types ``json_clean`` would return unchanged are accepted: any
+    subclass, tuple, non-finite float or non-string dict key needs cleaning.
+    """
+    kind = type(obj)
+
+    if kind in JSON_ATOMIC_TYPES:
+        return True
+
+    if kind is float:
+        return math.isfinite(obj)
+
+    if kind is list:
+        return all(map(is_json_safe, obj))
+
+    if kind is dict:
+        return all(type(key) is str for key in obj) and all(
+            map(is_json_safe, obj.values())
+        )
+
+    return False
+
+
 def json_clean(obj):  # pragma: no cover
     """Deprecated, this is a no-op for jupyter-client>=7.
 
@@ -99,11 +127,17 @@ def json_clean(obj):  # pragma: no cover
         encoded as JSON.  Note that this function does not *encode* its inputs,
         it simply sanitizes it so that there will be no encoding errors later.
 
+    lite: objects which are already json-safe are returned as-is, so the cleaning
+    (and copying) below only happens for the values which need it.
+
     """
     # lite: we don't have this
     # if int(JUPYTER_CLIENT_MAJOR_VERSION) >= 7:
     #     return obj
 
+    if is_json_safe(obj):
+        return obj
+
     # types that are 'atomic' and ok in json as-is.
     atomic_ok = (str, type(None))
 
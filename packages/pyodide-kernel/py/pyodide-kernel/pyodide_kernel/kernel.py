@@ -1,17 +1,36 @@
 # This is our ipykernel mock
+import importlib
+import importlib.machinery
+import sys
 import typing
 
 from .comm import get_comm_manager, CommManager
 
 from IPython.utils.tokenutil import line_at_cursor, token_at_cursor
 from pyodide_js import loadPackagesFromImports as _load_packages_from_imports
-from traitlets import Any, Instance, default
+from traitlets import Any, Instance, Set, default
 from traitlets.config import LoggingConfigurable
 
 if typing.TYPE_CHECKING:
     from .interpreter import Interpreter
 
-from .litetransform import LiteTransformerManager
+from .display import LiteStream, output_budget
+from .litetransform import LiteTransformerManager, get_imported_names
+
+
+def get_extension_packages(modules):
+    """Get the top-level names of packages with any compiled extension modules.
+
+    These cannot be safely imported again once removed from ``sys.modules``.
+    """
+    names = set()
+
+    for name, module in list(modules.items()):
+        loader = getattr(getattr(module, "__spec__", None), "loader", None)
+        if isinstance(loader, importlib.machinery.ExtensionFileLoader):
+            names.add(name.split(".")[0])
+
+    return names
 
 
 class PyodideKernel(LoggingConfigurable):
@@ -22,13 +41,33 @@ class PyodideKernel(LoggingConfigurable):
         LiteTransformerManager, ()
     )
 
+    #: the top-level names already checked for pyodide packages
+    _resolved_imports: typing.Set[str] = Set()
+
+    #: the names of the modules loaded before the first cell, kept by ``reset``
+    _startup_modules = None
+
+    #: the message being handled, as converted to python by ``get_parent``
+    _parent_header = None
+
+    #: the message being handled, as received from JS
+    _parent_js = None
+
     @default("comm_manager")
     def _default_comm_manager(self):
         return get_comm_manager()
 
+    def set_parent(self, parent):
+        """Remember the message being handled, only converting it when needed"""
+        self._parent_js = parent
+        self._parent_header = None
+
     def get_parent(self):
         # TODO mimic ipykernel's get_parent signature
         # (take a channel parameter)
+        if self._parent_header is None and self._parent_js is not None:
+            self._parent_header = self._parent_js.to_py()
+            self._parent_js = None
         return self._parent_header
 
     def comm_info(self, target_name=""):
@@ -84,23 +123,76 @@ class PyodideKernel(LoggingConfigurable):
             "status": "ok",
         }
 
+    async def load_packages_from_imports(self, code):
+        """Load the pyodide packages a cell imports, unless all are already known"""
+        names = get_imported_names(code)
+
+        if names is not None and all(
+            name in sys.modules or name in self._resolved_imports for name in names
+        ):
+            return
+
+        await _load_packages_from_imports(code)
+
+        if names is not None:
+            self._resolved_imports.update(names)
+
+    def reset(self):
+        """Forget the state of all cells, for a restart which keeps the runtime.
+
+        The user namespace, history and execution count are cleared, and modules
+        imported by cells are removed from ``sys.modules``, except for packages
+        with compiled extensions, which cannot be imported again. Installed
+        packages, and the modules loaded before the first cell, are kept. Pending
+        display updates are dropped rather than published in the new session.
+
+        Any asyncio tasks started by cells are not cancelled, and keep running.
+        """
+        LiteStream.flush_pending()
+        self.interpreter.display_pub.discard_updates()
+        self.comm_manager.comms.clear()
+        self.interpreter.reset(new_session=True)
+        self.interpreter._last_traceback = None
+        self.lite_transform_manager.clear_cache()
+        output_budget.reset()
+
+        if self._startup_modules is None:
+            return
+
+        keep = self._startup_modules | get_extension_packages(sys.modules)
+
+        for name in list(sys.modules):
+            if name not in keep and name.split(".")[0] not in keep:
+                del sys.modules[name]
+
+        importlib.invalidate_caches()
+
     async def run(self, code):
+        if self._startup_modules is None:
+            self._startup_modules = set(sys.modules)
+
         self.interpreter._last_traceback = None
         # apply pyodide-specific changes that need to occur before interpreting
-        code = await self.lite_transform_manager.transform_cell(code)
-        exec_code = self.interpreter.transform_cell(code)
+        code, exec_code = await self.lite_transform_manager.transform_cell_cached(
+            code, self.interpreter
+        )
 
         results = {}
+        output_budget.reset()
 
         try:
-            await _load_packages_from_imports(exec_code)
+            await self.load_packages_from_imports(exec_code)
         except Exception:
             self.interpreter.showtraceback()
         else:
-            if self.interpreter.should_run_async(code):
-                await self.interpreter.run_cell_async(code, store_history=True)
-            else:
-                self.interpreter.run_cell(code, store_history=True)
+            try:
+                if self.interpreter.should_run_async(code):
+                    await self.interpreter.run_cell_async(code, store_history=True)
+                else:
+                    self.interpreter.run_cell(code, store_history=True)
+            finally:
+                LiteStream.flush_pending()
+                self.interpreter.display_pub.flush_updates()
 
             results["payload"] = self.interpreter.payload_manager.read_payload()
             self.interpreter.payload_manager.clear_payload()
@@ -6,6 +6,7 @@ Derived from:
 """
 import re
 import shlex
+from collections import OrderedDict
 
 from IPython.core.inputtransformer2 import (
     TRANSFORM_LOOP_LIMIT,
@@ -14,13 +15,47 @@ from IPython.core.inputtransformer2 import (
     make_tokens_by_line,
 )
 
+#: a line using the ``%pip`` magic
+PIP_MAGIC = re.compile(r"^(\s*)%pip\b(.*)$", re.MULTILINE)
+
+#: the start of a python statement which imports modules
+IMPORT_PATTERN = re.compile(
+    r"(?:^|[;:])[ \t]*(?:from[ \t]+(\w+)|import[ \t]+([^#;\n]+))", re.MULTILINE
+)
+
+
+def get_imported_names(code):
+    """Get the top-level names a cell may import, without parsing it.
+
+    Returns ``None`` if lines are continued with a backslash, which may hide names.
+    """
+    if "\\\n" in code:
+        return None
+
+    names = set()
+
+    for from_name, import_names in IMPORT_PATTERN.findall(code):
+        if from_name:
+            names.add(from_name)
+            continue
+        for import_name in import_names.split(","):
+            parts = import_name.split()
+            if parts:
+                names.add(parts[0].split(".")[0])
+
+    return names
+
 
 class LiteTransformerManager(TransformerManager):
+    #: the number of transformed cells to remember, or 0
+    cache_size = 128
+
     def __init__(self):
         super().__init__()
         self.cleanup_transforms = []
         self.line_transforms = [pip_magic]
         self.token_transformers = []
+        self._cache = OrderedDict()
 
     async def transform_cell(self, cell: str) -> str:
         """Transforms a cell of input code"""
@@ -30,9 +65,56 @@ class LiteTransformerManager(TransformerManager):
         for transform in self.cleanup_transforms + self.line_transforms:
             lines = await transform(lines)
 
-        lines = await self.do_token_transforms(lines)
+        if self.token_transformers:
+            lines = await self.do_token_transforms(lines)
         return "".join(lines)
 
+    async def transform_cell_cached(self, cell: str, shell) -> tuple:
+        """Transform a cell, and then its python as ``shell.transform_cell`` would.
+
+        The static transforms of the most recent ``cache_size`` cells, by these and
+        the ``shell``'s ``input_transformer_manager``, are remembered, and reused
+        when an unchanged cell is transformed again with the same transformers.
+        The transforms which depend on the ``shell``'s state, i.e. prefilters and
+        ``input_transformers_post``, always run. Cells using ``%pip`` are always
+        transformed, as that has side effects.
+        """
+        key = None
+
+        if self.cache_size and not has_pip_magic(cell):
+            python_manager = shell.input_transformer_manager
+            key = (
+                cell,
+                tuple(self.cleanup_transforms),
+                tuple(self.line_transforms),
+                tuple(self.token_transformers),
+                tuple(python_manager.cleanup_transforms),
+                tuple(python_manager.line_transforms),
+                tuple(python_manager.token_transformers),
+            )
+            try:
+                hash(key)
+            except TypeError:
+                key = None
+
+        if key is not None and key in self._cache:
+            self._cache.move_to_end(key)
+            code, static_code = self._cache[key]
+        else:
+            code = await self.transform_cell(cell)
+            static_code = shell.input_transformer_manager.transform_cell(code)
+
+            if key is not None:
+                self._cache[key] = code, static_code
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return code, transform_dynamic(shell, static_code)
+
+    def clear_cache(self):
+        """Forget all transformed cells"""
+        self._cache.clear()
+
     async def do_token_transforms(self, lines):
         for _ in range(TRANSFORM_LOOP_LIMIT):
             changed, lines = await self.do_one_token_transform(lines)
@@ -74,12 +156,38 @@ class LiteTransformerManager(TransformerManager):
         return False, lines
 
 
+def transform_dynamic(shell, cell: str) -> str:
+    """Apply the transforms of ``shell.transform_cell`` which follow its static
+    ``input_transformer_manager``, and depend on the state of the ``shell``.
+
+    Derived from:
+
+       https://github.com/ipython/ipython/blob/8.5.0/IPython/core/interactiveshell.py
+    """
+    if len(cell.splitlines()) == 1:
+        with shell.builtin_trap:
+            cell = shell.prefilter_manager.prefilter_lines(cell) + "\n"
+
+    lines = cell.splitlines(keepends=True)
+    for transform in shell.input_transformers_post:
+        lines = transform(lines)
+    return "".join(lines)
+
+
+def has_pip_magic(cell: str) -> bool:
+    """Whether any line of a cell might use ``%pip``, without tokenizing it."""
+    return "%pip" in cell and PIP_MAGIC.search(cell) is not None
+
+
 async def pip_magic(lines: list[str]) -> list[str]:
     """Replace ``%pip`` with ``piplite`` actions."""
+    if not any("%pip" in line for line in lines):
+        return lines
+
     new_lines = []
 
     for line in lines:
-        pip_match = re.match(r"^(\s*)%pip\b(.*)$", line)
+        pip_match = PIP_MAGIC.match(line)
         if not pip_match:
             new_lines.append(line)
             continue
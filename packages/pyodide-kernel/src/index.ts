@@ -4,5 +4,6 @@
 export * from './_pypi';
 export * from './comlink.worker';
 export * from './kernel';
+export * from './pool';
 export * from './tokens';
 export * from './worker';
@@ -5,7 +5,9 @@ import { KernelMessage } from '@jupyterlab/services';
 
 import { BaseKernel, IKernel } from '@jupyterlite/kernel';
 
-import { wrap } from 'comlink';
+import { transfer, wrap } from 'comlink';
+
+import type { PyodideWorkerPool } from './pool';
 
 import { IPyodideWorkerKernel, IRemotePyodideWorkerKernel } from './tokens';
 
@@ -22,10 +24,37 @@ export class PyodideKernel extends BaseKernel implements IKernel {
    */
   constructor(options: PyodideKernel.IOptions) {
     super(options);
-    this._worker = this.initWorker(options);
-    this._worker.onmessage = (e) => this._processWorkerMessage(e.data);
-    this._remoteKernel = wrap(this._worker);
-    this.initRemote(options);
+    this._softRestart = !!options.softRestart;
+    const restart = Private.claimRestart(this.id);
+    const pooled = restart?.worker ? null : this.claimPooled(options);
+    if (restart?.worker && restart.remoteKernel) {
+      this._worker = restart.worker;
+      this._remoteKernel = restart.remoteKernel;
+      this._worker.onmessage = (e) => this._processWorkerMessage(e.data);
+      this.initReset(options, restart.start);
+    } else if (pooled) {
+      this._worker = pooled.worker;
+      this._remoteKernel = pooled.remoteKernel;
+      this._worker.onmessage = (e) => this._processWorkerMessage(e.data);
+      this.initPooled(pooled, restart?.start);
+    } else {
+      this._worker = this.startWorker(options);
+      this._remoteKernel = wrap(this._worker);
+      this.initRemote(options).then(() => {
+        if (restart) {
+          this.reportRestart('hard', restart.start);
+        }
+      });
+    }
+  }
+
+  /**
+   * Start a new worker, and handle its messages.
+   */
+  protected startWorker(options: PyodideKernel.IOptions): Worker {
+    const worker = this.initWorker(options);
+    worker.onmessage = (e) => this._processWorkerMessage(e.data);
+    return worker;
   }
 
   /**
@@ -44,40 +73,107 @@ export class PyodideKernel extends BaseKernel implements IKernel {
 
   protected async initRemote(options: PyodideKernel.IOptions): Promise<void> {
     const remoteOptions = this.initRemoteOptions(options);
-    await this._remoteKernel.initialize(remoteOptions);
+    this._startupMetrics = await PyodideKernel.initializeRemote(
+      this._remoteKernel,
+      remoteOptions,
+    );
+    console.info('Pyodide kernel startup (ms)', this._startupMetrics);
+    this._isReady = true;
     this._ready.resolve();
   }
 
-  protected initRemoteOptions(
+  /**
+   * Reset the worker of the previous kernel with the same id, or start a new one if
+   * that fails.
+   */
+  protected async initReset(
     options: PyodideKernel.IOptions,
-  ): IPyodideWorkerKernel.IOptions {
-    const { pyodideUrl } = options;
-    const indexUrl = pyodideUrl.slice(0, pyodideUrl.lastIndexOf('/') + 1);
-    const baseUrl = PageConfig.getBaseUrl();
-    const pipliteUrls = [...(options.pipliteUrls || []), allJSONUrl.default];
+    start: number,
+  ): Promise<void> {
+    try {
+      await this._remoteKernel.reset();
+    } catch (err) {
+      console.warn('Pyodide kernel soft restart failed, starting a new worker', err);
+      this._worker.terminate();
+      this._worker = this.startWorker(options);
+      this._remoteKernel = wrap(this._worker);
+      await this.initRemote(options);
+      this.reportRestart('hard', start);
+      return;
+    }
+    this._isReady = true;
+    this._ready.resolve();
+    this.reportRestart('soft', start);
+  }
 
-    const disablePyPIFallback = !!options.disablePyPIFallback;
+  /**
+   * Record and log how long restarting the kernel took.
+   *
+   * @param mode Whether the runtime was kept
+   * @param start When the previous kernel was disposed
+   */
+  protected reportRestart(
+    mode: IPyodideWorkerKernel.IRestartMetrics['mode'],
+    start: number,
+  ): void {
+    this._restartMetrics = { mode, total: performance.now() - start };
+    console.info('Pyodide kernel restart (ms)', this._restartMetrics);
+  }
 
-    return {
-      baseUrl,
-      pyodideUrl,
-      indexUrl,
-      pipliteWheelUrl: options.pipliteWheelUrl || pipliteWheelUrl.default,
-      pipliteUrls,
-      disablePyPIFallback,
-      location: this.location,
-      mountDrive: options.mountDrive,
-    };
+  /**
+   * Take a ready worker from the pool, if there is one for this kernel's drive.
+   */
+  protected claimPooled(
+    options: PyodideKernel.IOptions,
+  ): PyodideWorkerPool.IWorker | null {
+    if (!options.pool || this.location.includes(':')) {
+      return null;
+    }
+    return options.pool.claim();
+  }
+
+  /**
+   * Move a worker from the pool to this kernel's location.
+   *
+   * @param pooled The worker claimed from the pool
+   * @param restartStart When the previous kernel was disposed, if this is a restart
+   */
+  protected async initPooled(
+    pooled: PyodideWorkerPool.IWorker,
+    restartStart?: number,
+  ): Promise<void> {
+    await this._remoteKernel.setLocation(this.location);
+    this._startupMetrics = pooled.startupMetrics;
+    console.info('Pyodide kernel from pool, startup (ms)', this._startupMetrics);
+    this._isReady = true;
+    this._ready.resolve();
+    if (restartStart !== undefined) {
+      this.reportRestart('pool', restartStart);
+    }
+  }
+
+  protected initRemoteOptions(
+    options: PyodideKernel.IOptions,
+  ): IPyodideWorkerKernel.IOptions {
+    return PyodideKernel.getRemoteOptions(options, this.location);
   }
 
   /**
    * Dispose the kernel.
+   *
+   * With `softRestart`, a ready worker which is not executing code is kept
+   * briefly, for a new kernel with the same id, i.e. a restart, to reset and reuse.
    */
   dispose(): void {
     if (this.isDisposed) {
       return;
     }
-    this._worker.terminate();
+    if (this._softRestart && this._isReady && !this._executing) {
+      Private.releaseWorker(this.id, this._worker, this._remoteKernel);
+    } else {
+      this._worker.terminate();
+      Private.releaseWorker(this.id);
+    }
     (this._worker as any) = null;
     super.dispose();
   }
@@ -89,6 +185,20 @@ export class PyodideKernel extends BaseKernel implements IKernel {
     return this._ready.promise;
   }
 
+  /**
+   * How this kernel was restarted, if it was, and how long that took.
+   */
+  get restartMetrics(): IPyodideWorkerKernel.IRestartMetrics | null {
+    return this._restartMetrics ? { ...this._restartMetrics } : null;
+  }
+
+  /**
+   * How long each step of starting the kernel took, in milliseconds.
+   */
+  get startupMetrics(): IPyodideWorkerKernel.IStartupMetrics {
+    return { ...this._startupMetrics };
+  }
+
   /**
    * Process a message coming from the pyodide web worker.
    *
@@ -195,9 +305,14 @@ export class PyodideKernel extends BaseKernel implements IKernel {
     content: KernelMessage.IExecuteRequestMsg['content'],
   ): Promise<KernelMessage.IExecuteReplyMsg['content']> {
     await this.ready;
-    const result = await this._remoteKernel.execute(content, this.parent);
-    result.execution_count = this.executionCount;
-    return result;
+    this._executing++;
+    try {
+      const result = await this._remoteKernel.execute(content, this.parent);
+      result.execution_count = this.executionCount;
+      return result;
+    } finally {
+      this._executing--;
+    }
   }
 
   /**
@@ -256,7 +371,7 @@ export class PyodideKernel extends BaseKernel implements IKernel {
    * @param msg - The comm_open message.
    */
   async commOpen(msg: KernelMessage.ICommOpenMsg): Promise<void> {
-    return await this._remoteKernel.commOpen(msg, this.parent);
+    return await this._remoteKernel.commOpen(this.transferBuffers(msg), this.parent);
   }
 
   /**
@@ -265,7 +380,7 @@ export class PyodideKernel extends BaseKernel implements IKernel {
    * @param msg - The comm_msg message.
    */
   async commMsg(msg: KernelMessage.ICommMsgMsg): Promise<void> {
-    return await this._remoteKernel.commMsg(msg, this.parent);
+    return await this._remoteKernel.commMsg(this.transferBuffers(msg), this.parent);
   }
 
   /**
@@ -274,7 +389,26 @@ export class PyodideKernel extends BaseKernel implements IKernel {
    * @param close - The comm_close message.
    */
   async commClose(msg: KernelMessage.ICommCloseMsg): Promise<void> {
-    return await this._remoteKernel.commClose(msg, this.parent);
+    return await this._remoteKernel.commClose(this.transferBuffers(msg), this.parent);
+  }
+
+  /**
+   * Mark the binary buffers of a message to be moved, rather than copied, to the
+   * worker.
+   *
+   * The buffers of messages received by the kernel are not shared with the client.
+   *
+   * @param msg - A message which may have binary buffers.
+   */
+  protected transferBuffers<T extends KernelMessage.IMessage>(msg: T): T {
+    const transferables = new Set<ArrayBuffer>();
+    for (const buffer of msg.buffers || []) {
+      const arrayBuffer = ArrayBuffer.isView(buffer) ? buffer.buffer : buffer;
+      if (arrayBuffer instanceof ArrayBuffer) {
+        transferables.add(arrayBuffer);
+      }
+    }
+    return transferables.size ? transfer(msg, [...transferables]) : msg;
   }
 
   /**
@@ -289,12 +423,80 @@ export class PyodideKernel extends BaseKernel implements IKernel {
   private _worker: Worker;
   private _remoteKernel: IRemotePyodideWorkerKernel;
   private _ready = new PromiseDelegate<void>();
+  private _isReady = false;
+  private _executing = 0;
+  private _softRestart = false;
+  private _startupMetrics: IPyodideWorkerKernel.IStartupMetrics = {};
+  private _restartMetrics: IPyodideWorkerKernel.IRestartMetrics | null = null;
 }
 
 /**
  * A namespace for PyodideKernel statics.
  */
 export namespace PyodideKernel {
+  /**
+   * Get the options to initialize a worker with, for a kernel in a location.
+   *
+   * @param options The options of the runtime, which do not depend on the kernel
+   * @param location The location of the kernel
+   */
+  export function getRemoteOptions(
+    options: IRuntimeOptions,
+    location: string,
+  ): IPyodideWorkerKernel.IOptions {
+    const { pyodideUrl } = options;
+    const indexUrl = pyodideUrl.slice(0, pyodideUrl.lastIndexOf('/') + 1);
+    const baseUrl = PageConfig.getBaseUrl();
+    const pipliteUrls = [...(options.pipliteUrls || []), allJSONUrl.default];
+
+    const disablePyPIFallback = !!options.disablePyPIFallback;
+
+    return {
+      baseUrl,
+      pyodideUrl,
+      indexUrl,
+      pipliteWheelUrl: options.pipliteWheelUrl || pipliteWheelUrl.default,
+      pipliteUrls,
+      pipliteLockUrl: options.pipliteLockUrl,
+      pipliteWheelStoreQuota: options.pipliteWheelStoreQuota,
+      persistSitePackages: !!options.persistSitePackages,
+      disablePyPIFallback,
+      location,
+      mountDrive: options.mountDrive,
+    };
+  }
+
+  /**
+   * The compiled WebAssembly modules of the runtime, by the URL of `pyodide.js`
+   */
+  const wasmModules = new Map<string, IPyodideWorkerKernel.IWasmModule>();
+
+  /**
+   * Initialize a worker, sharing the compiled WebAssembly module of the runtime
+   * with any later workers using the same `pyodideUrl`.
+   *
+   * The worker only uses a shared module if its content hash matches the `.wasm`
+   * file it loads.
+   *
+   * @param remoteKernel The worker to initialize
+   * @param options The options to initialize the worker with
+   */
+  export async function initializeRemote(
+    remoteKernel: IRemotePyodideWorkerKernel,
+    options: IPyodideWorkerKernel.IOptions,
+  ): Promise<IPyodideWorkerKernel.IStartupMetrics> {
+    const { pyodideUrl } = options;
+    const wasmModule = wasmModules.get(pyodideUrl);
+    const metrics = await remoteKernel.initialize({ ...options, wasmModule });
+    if (!metrics.wasmCacheHit) {
+      const compiled = await remoteKernel.getWasmModule();
+      if (compiled) {
+        wasmModules.set(pyodideUrl, compiled);
+      }
+    }
+    return metrics;
+  }
+
   /**
    * The instantiation options for a Pyodide kernel
    */
@@ -314,14 +516,110 @@ export namespace PyodideKernel {
      */
     pipliteUrls: string[];
 
+    /**
+     * The URL of the lock of wheels to install when the kernel starts
+     */
+    pipliteLockUrl?: string;
+
     /**
      * Do not try pypi.org if `piplite.install` fails against local URLs
      */
     disablePyPIFallback: boolean;
 
+    /**
+     * The most MiB of downloaded wheels to keep across page loads, or `0`
+     */
+    pipliteWheelStoreQuota?: number;
+
+    /**
+     * Whether to keep installed packages across page loads, in IndexedDB
+     */
+    persistSitePackages?: boolean;
+
     /**
      * Whether or not to mount the Emscripten drive
      */
     mountDrive: boolean;
+
+    /**
+     * Whether to restart by resetting the worker, keeping the runtime and packages
+     */
+    softRestart?: boolean;
+
+    /**
+     * A pool of ready workers to claim, instead of starting a new one
+     */
+    pool?: PyodideWorkerPool | null;
+  }
+
+  /**
+   * The options of the Pyodide runtime, which do not depend on the kernel
+   */
+  export type IRuntimeOptions = Omit<IOptions, keyof IKernel.IOptions>;
+}
+
+/**
+ * A namespace for module private data.
+ */
+namespace Private {
+  /**
+   * How long to keep a disposed kernel's worker for a restart, in milliseconds.
+   */
+  const RESTART_TIMEOUT = 5000;
+
+  /**
+   * A kernel which was disposed, and may be about to restart.
+   */
+  export interface IRestart {
+    /**
+     * When the kernel was disposed.
+     */
+    start: number;
+
+    /**
+     * A ready worker to reset and reuse, if soft restarts are enabled.
+     */
+    worker?: Worker;
+
+    /**
+     * The comlink wrapper of the worker.
+     */
+    remoteKernel?: IRemotePyodideWorkerKernel;
+
+    /**
+     * The timer which terminates an unclaimed worker.
+     */
+    timeout: ReturnType<typeof setTimeout>;
+  }
+
+  const restarts = new Map<string, IRestart>();
+
+  /**
+   * Remember a disposed kernel, keeping its worker until a restart claims it.
+   */
+  export function releaseWorker(
+    id: string,
+    worker?: Worker,
+    remoteKernel?: IRemotePyodideWorkerKernel,
+  ): void {
+    claimRestart(id)?.worker?.terminate();
+    const timeout = setTimeout(() => {
+      restarts.delete(id);
+      worker?.terminate();
+    }, RESTART_TIMEOUT);
+    restarts.set(id, { start: performance.now(), worker, remoteKernel, timeout });
+  }
+
+  /**
+   * Get the disposed kernel with the same id, if this kernel is a restart of it.
+   */
+  export function claimRestart(id: string): IRestart | null {
+    const restart = restarts.get(id);
+    if (!restart) {
+      return null;
+    }
+    clearTimeout(restart.timeout);
+    restarts.delete(id);
+    return restart;
   }
 }
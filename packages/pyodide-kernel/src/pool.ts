@@ -0,0 +1,211 @@
+// Copyright (c) Jupyter Development Team.
+// Distributed under the terms of the Modified BSD License.
+
+import { wrap } from 'comlink';
+
+import { PyodideKernel } from './kernel';
+
+import { IPyodideWorkerKernel, IRemotePyodideWorkerKernel } from './tokens';
+
+/**
+ * A pool of Pyodide workers which have finished initializing, for new kernels to
+ * claim instead of starting from scratch.
+ */
+export class PyodideWorkerPool {
+  /**
+   * Instantiate a new PyodideWorkerPool, and start filling it when idle.
+   *
+   * @param options The instantiation options for a new PyodideWorkerPool
+   */
+  constructor(options: PyodideWorkerPool.IOptions) {
+    this._size = Math.max(0, options.size);
+    this._memoryBudget = options.memoryBudget || 0;
+    this._remoteOptions = options.remoteOptions;
+    this.fill();
+  }
+
+  /**
+   * Whether the pool has been disposed.
+   */
+  get isDisposed(): boolean {
+    return this._isDisposed;
+  }
+
+  /**
+   * The number of workers the pool may keep, given its size and memory budget.
+   *
+   * Until a worker has started, each is assumed to use `DEFAULT_HEAP_SIZE` bytes.
+   */
+  get capacity(): number {
+    const heapSize = this._heapSize || PyodideWorkerPool.DEFAULT_HEAP_SIZE;
+    const byMemory = this._memoryBudget
+      ? Math.floor(this._memoryBudget / heapSize)
+      : Infinity;
+    return Math.min(this._size, byMemory);
+  }
+
+  /**
+   * The number of workers ready to be claimed.
+   */
+  get readyCount(): number {
+    return this._ready.length;
+  }
+
+  /**
+   * Take a ready worker, if there is one, and fill the pool again when idle.
+   */
+  claim(): PyodideWorkerPool.IWorker | null {
+    const worker = this._ready.shift() || null;
+    this.fill();
+    return worker;
+  }
+
+  /**
+   * Start another worker when idle, until the pool is full.
+   */
+  fill(): void {
+    if (
+      this._isDisposed ||
+      this._failed ||
+      this._filling ||
+      this._ready.length >= this.capacity
+    ) {
+      return;
+    }
+    this._filling = true;
+    Private.whenIdle(async () => {
+      try {
+        await this.startWorker();
+      } finally {
+        this._filling = false;
+        this.fill();
+      }
+    });
+  }
+
+  /**
+   * Terminate all the ready workers.
+   */
+  dispose(): void {
+    if (this._isDisposed) {
+      return;
+    }
+    this._isDisposed = true;
+    for (const { worker } of this._ready.splice(0)) {
+      worker.terminate();
+    }
+  }
+
+  /**
+   * Load the worker.
+   *
+   * ### Note
+   *
+   * Subclasses must implement this typographically almost _exactly_ for
+   * webpack to find it.
+   */
+  protected initWorker(): Worker {
+    return new Worker(new URL('./comlink.worker.js', import.meta.url), {
+      type: 'module',
+    });
+  }
+
+  /**
+   * Start and initialize a worker, adding it to the pool if there is still room.
+   */
+  protected async startWorker(): Promise<void> {
+    const worker = this.initWorker();
+    const remoteKernel: IRemotePyodideWorkerKernel = wrap(worker);
+    try {
+      const startupMetrics = await PyodideKernel.initializeRemote(
+        remoteKernel,
+        this._remoteOptions,
+      );
+      this._heapSize = Math.max(this._heapSize, await remoteKernel.getHeapSize());
+      if (this._isDisposed || this._ready.length >= this.capacity) {
+        worker.terminate();
+        return;
+      }
+      this._ready.push({ worker, remoteKernel, startupMetrics });
+    } catch (err) {
+      console.warn('Pyodide kernel pool stopped, after failing to start', err);
+      worker.terminate();
+      this._failed = true;
+    }
+  }
+
+  private _size: number;
+  private _memoryBudget: number;
+  private _remoteOptions: IPyodideWorkerKernel.IOptions;
+  private _ready: PyodideWorkerPool.IWorker[] = [];
+  private _heapSize = 0;
+  private _filling = false;
+  private _failed = false;
+  private _isDisposed = false;
+}
+
+/**
+ * A namespace for PyodideWorkerPool statics.
+ */
+export namespace PyodideWorkerPool {
+  /**
+   * The assumed memory of a worker, in bytes, until one has started.
+   */
+  export const DEFAULT_HEAP_SIZE = 256 * 1024 * 1024;
+
+  /**
+   * The instantiation options for a pool of Pyodide workers
+   */
+  export interface IOptions {
+    /**
+     * The largest number of ready workers to keep.
+     */
+    size: number;
+
+    /**
+     * The most memory all ready workers may use, in bytes, or `0` for no limit.
+     */
+    memoryBudget?: number;
+
+    /**
+     * The options to initialize each worker with, in a location on the default drive.
+     */
+    remoteOptions: IPyodideWorkerKernel.IOptions;
+  }
+
+  /**
+   * A worker which has finished initializing.
+   */
+  export interface IWorker {
+    /**
+     * The web worker.
+     */
+    worker: Worker;
+
+    /**
+     * The comlink wrapper of the worker.
+     */
+    remoteKernel: IRemotePyodideWorkerKernel;
+
+    /**
+     * How long each step of starting the worker took, in milliseconds.
+     */
+    startupMetrics: IPyodideWorkerKernel.IStartupMetrics;
+  }
+}
+
+/**
+ * A namespace for module private data.
+ */
+namespace Private {
+  /**
+   * Run a callback when the main thread is idle, or soon, if that cannot be known.
+   */
+  export function whenIdle(callback: () => void): void {
+    if (typeof requestIdleCallback === 'function') {
+      requestIdleCallback(callback);
+    } else {
+      setTimeout(callback, 0);
+    }
+  }
+}
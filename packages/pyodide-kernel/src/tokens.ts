@@ -19,9 +19,31 @@ export * as PIPLITE_INDEX_SCHEMA from '../schema/piplite.v0.schema.json';
  */
 export interface IPyodideWorkerKernel extends IWorkerKernel {
   /**
-   * Handle any lazy initialization activities.
+   * Handle any lazy initialization activities, returning how long they took.
    */
-  initialize(options: IPyodideWorkerKernel.IOptions): Promise<void>;
+  initialize(
+    options: IPyodideWorkerKernel.IOptions,
+  ): Promise<IPyodideWorkerKernel.IStartupMetrics>;
+
+  /**
+   * Forget the state of all cells, keeping the runtime and installed packages.
+   */
+  reset(): Promise<void>;
+
+  /**
+   * Move a kernel started ahead of time to its location, on the same drive.
+   */
+  setLocation(location: string): Promise<void>;
+
+  /**
+   * Get the size of the WebAssembly memory of the runtime, in bytes.
+   */
+  getHeapSize(): Promise<number>;
+
+  /**
+   * Get the compiled WebAssembly module of the runtime, to share with later workers.
+   */
+  getWasmModule(): Promise<IPyodideWorkerKernel.IWasmModule | null>;
 }
 
 /**
@@ -57,11 +79,26 @@ export namespace IPyodideWorkerKernel {
      */
     pipliteUrls: string[];
 
+    /**
+     * The URL of a lock of the exact wheels to install before starting the kernel.
+     */
+    pipliteLockUrl?: string;
+
     /**
      * Whether `piplite` should fall back to the hard-coded `pypi.org` for resolving packages.
      */
     disablePyPIFallback: boolean;
 
+    /**
+     * The most MiB of downloaded wheels `piplite` keeps across page loads, or `0`.
+     */
+    pipliteWheelStoreQuota?: number;
+
+    /**
+     * Whether to keep installed packages across page loads, in IndexedDB.
+     */
+    persistSitePackages?: boolean;
+
     /**
      * The current working directory in which to start the kernel.
      */
@@ -71,5 +108,48 @@ export namespace IPyodideWorkerKernel {
      * Whether or not to mount the Emscripten drive
      */
     mountDrive: boolean;
+
+    /**
+     * The runtime's WebAssembly module, as compiled by an earlier worker.
+     */
+    wasmModule?: IWasmModule;
+  }
+
+  /**
+   * A compiled WebAssembly module, which can be sent to other workers.
+   */
+  export interface IWasmModule {
+    /**
+     * The SHA-256 of the `.wasm` file the module was compiled from.
+     */
+    sha256: string;
+
+    /**
+     * The compiled module.
+     */
+    module: WebAssembly.Module;
+  }
+
+  /**
+   * The duration of each step of kernel startup, in milliseconds.
+   */
+  export interface IStartupMetrics {
+    [step: string]: number;
+  }
+
+  /**
+   * How a kernel was restarted, and how long it took, in milliseconds.
+   */
+  export interface IRestartMetrics {
+    /**
+     * Whether the runtime was kept (`soft`), taken from a pool of ready workers
+     * (`pool`), or started again (`hard`).
+     */
+    mode: 'soft' | 'pool' | 'hard';
+
+    /**
+     * The time from disposing the previous kernel until this one was ready.
+     */
+    total: number;
   }
 }
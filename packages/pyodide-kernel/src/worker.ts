@@ -7,6 +7,22 @@ import type { DriveFS } from '@jupyterlite/contents';
 
 import type { IPyodideWorkerKernel } from './tokens';
 
+/**
+ * The packages installed before the kernel starts, as locked by the piplite addon
+ */
+const BOOTSTRAP_PACKAGES = [
+  'sqlite3',
+  'ipykernel',
+  'comm',
+  'pyodide_kernel',
+  'ipython',
+];
+
+/**
+ * The file describing what a persisted site-packages was installed for
+ */
+const SITE_PACKAGES_VERSION = '.piplite-site-packages.json';
+
 export class PyodideRemoteKernel {
   constructor() {
     this._initialized = new Promise((resolve, reject) => {
@@ -17,7 +33,10 @@ export class PyodideRemoteKernel {
   /**
    * Accept the URLs from the host
    **/
-  async initialize(options: IPyodideWorkerKernel.IOptions): Promise<void> {
+  async initialize(
+    options: IPyodideWorkerKernel.IOptions,
+  ): Promise<IPyodideWorkerKernel.IStartupMetrics> {
+    const start = performance.now();
     this._options = options;
 
     if (options.location.includes(':')) {
@@ -29,12 +48,27 @@ export class PyodideRemoteKernel {
       this._localPath = options.location;
     }
 
-    await this.initRuntime(options);
-    await this.initFilesystem(options);
-    await this.initPackageManager(options);
-    await this.initKernel(options);
-    await this.initGlobals(options);
+    await this.timed('initRuntime', () => this.initRuntime(options));
+    await this.timed('initFilesystem', () => this.initFilesystem(options));
+    await this.timed('initSitePackages', () => this.initSitePackages(options));
+    await this.timed('initPackageManager', () => this.initPackageManager(options));
+    await this.timed('initKernel', () => this.initKernel(options));
+    await this.timed('initGlobals', () => this.initGlobals(options));
+    this._startupMetrics.total = performance.now() - start;
     this._initializer?.resolve();
+    return { ...this._startupMetrics };
+  }
+
+  /**
+   * Record how long one step of startup takes, in milliseconds.
+   */
+  protected async timed<T>(step: string, fn: () => Promise<T>): Promise<T> {
+    const start = performance.now();
+    try {
+      return await fn();
+    } finally {
+      this._startupMetrics[step] = performance.now() - start;
+    }
   }
 
   protected async initRuntime(options: IPyodideWorkerKernel.IOptions): Promise<void> {
@@ -50,9 +84,90 @@ export class PyodideRemoteKernel {
       importScripts(pyodideUrl);
       loadPyodide = (self as any).loadPyodide;
     }
+    this.interceptWasm(options.wasmModule);
     this._pyodide = await loadPyodide({ indexURL: indexUrl });
   }
 
+  /**
+   * Use a compiled WebAssembly module for the runtime, if its content hash matches,
+   * rather than compiling it again.
+   *
+   * Only the first module instantiated, i.e. `pyodide.asm.wasm`, is affected. With
+   * no module to reuse, a streamed module is still compiled while it downloads,
+   * and hashed alongside.
+   *
+   * @param cached The module compiled by an earlier worker, if any
+   */
+  protected interceptWasm(cached?: IPyodideWorkerKernel.IWasmModule): void {
+    const { instantiate, instantiateStreaming } = WebAssembly;
+    const metrics = this._startupMetrics;
+
+    const restore = () => {
+      WebAssembly.instantiate = instantiate;
+      WebAssembly.instantiateStreaming = instantiateStreaming;
+    };
+
+    const getSha256 = async (bytes: ArrayBuffer): Promise<string> => {
+      const digest = await crypto.subtle.digest('SHA-256', bytes);
+      return [...new Uint8Array(digest)]
+        .map((byte) => byte.toString(16).padStart(2, '0'))
+        .join('');
+    };
+
+    const getModule = async (bytes: ArrayBuffer): Promise<WebAssembly.Module> => {
+      restore();
+      const sha256 = await getSha256(bytes);
+      metrics.wasmCacheHit = cached?.sha256 === sha256 ? 1 : 0;
+      if (cached && metrics.wasmCacheHit) {
+        metrics.wasmCompile = 0;
+        this._wasmModule = cached;
+        return cached.module;
+      }
+      const start = performance.now();
+      const module = await WebAssembly.compile(bytes);
+      metrics.wasmCompile = performance.now() - start;
+      this._wasmModule = { sha256, module };
+      return module;
+    };
+
+    WebAssembly.instantiateStreaming = async (source, imports) => {
+      const response = await source;
+      if (cached) {
+        const module = await getModule(await response.arrayBuffer());
+        return { module, instance: await instantiate(module, imports) };
+      }
+      restore();
+      const start = performance.now();
+      const [result, sha256] = await Promise.all([
+        instantiateStreaming(response.clone(), imports),
+        response.arrayBuffer().then(getSha256),
+      ]);
+      metrics.wasmCacheHit = 0;
+      metrics.wasmCompile = performance.now() - start;
+      this._wasmModule = { sha256, module: result.module };
+      return result;
+    };
+
+    WebAssembly.instantiate = (async (source: any, imports?: any) => {
+      if (source instanceof WebAssembly.Module) {
+        return await instantiate(source, imports);
+      }
+      const bytes = ArrayBuffer.isView(source)
+        ? source.buffer.slice(source.byteOffset, source.byteOffset + source.byteLength)
+        : source;
+      const module = await getModule(bytes);
+      return { module, instance: await instantiate(module, imports) };
+    }) as any;
+  }
+
+  /**
+   * Get the compiled WebAssembly module of the runtime, to share with later workers.
+   */
+  async getWasmModule(): Promise<IPyodideWorkerKernel.IWasmModule | null> {
+    await this._initialized;
+    return this._wasmModule;
+  }
+
   protected async initPackageManager(
     options: IPyodideWorkerKernel.IOptions,
   ): Promise<void> {
@@ -61,6 +176,9 @@ export class PyodideRemoteKernel {
     }
 
     const { pipliteWheelUrl, disablePyPIFallback, pipliteUrls } = this._options;
+    const wheelStoreQuota = Math.floor(
+      (this._options.pipliteWheelStoreQuota ?? 512) * 1024 * 1024,
+    );
 
     await this._pyodide.loadPackage(['micropip']);
 
@@ -71,21 +189,48 @@ export class PyodideRemoteKernel {
       import piplite.piplite
       piplite.piplite._PIPLITE_DISABLE_PYPI = ${disablePyPIFallback ? 'True' : 'False'}
       piplite.piplite._PIPLITE_URLS = ${JSON.stringify(pipliteUrls)}
+      piplite.piplite._PIPLITE_WHEEL_STORE_QUOTA = ${wheelStoreQuota}
+      import asyncio
+      piplite.piplite._PIPLITE_PREFETCH = asyncio.ensure_future(
+        piplite.prefetch_indices()
+      )
     `);
   }
 
   protected async initKernel(options: IPyodideWorkerKernel.IOptions): Promise<void> {
+    const { pipliteLockUrl } = options;
+    const bootstrap = JSON.stringify(BOOTSTRAP_PACKAGES);
+
+    const install = pipliteLockUrl
+      ? `piplite.piplite._install_from_lock("${pipliteLockUrl}", ${bootstrap})`
+      : `piplite.install(${bootstrap}, keep_going=True)`;
+
     // from this point forward, only use piplite (but not %pip)
-    await this._pyodide.runPythonAsync(`
-      await piplite.install(['sqlite3'], keep_going=True);
-      await piplite.install(['ipykernel'], keep_going=True);
-      await piplite.install(['comm'], keep_going=True);
-      await piplite.install(['pyodide_kernel'], keep_going=True);
-      await piplite.install(['ipython'], keep_going=True);
-      import pyodide_kernel
-    `);
-    // cd to the kernel location
-    if (options.mountDrive && this._localPath) {
+    await this.timed('installBootstrap', () =>
+      this._pyodide.runPythonAsync(`await ${install}`),
+    );
+
+    // add what other kernels have saved before installing more
+    if (this._sitePackages) {
+      const piplite = this._pyodide.pyimport('piplite.piplite');
+      piplite._PIPLITE_SYNC_SITE_PACKAGES = () => this.mergeSitePackages();
+      piplite.destroy();
+    }
+    await this.timed('importKernel', () =>
+      this._pyodide.runPythonAsync(`
+        import pyodide_kernel
+      `),
+    );
+    this.reportPrefetch();
+    await this.persistSitePackages();
+    await this.chdir();
+  }
+
+  /**
+   * cd to the kernel location
+   */
+  protected async chdir(): Promise<void> {
+    if (this._options?.mountDrive && this._localPath) {
       await this._pyodide.runPythonAsync(`
         import os;
         os.chdir("${this._localPath}");
@@ -93,6 +238,34 @@ export class PyodideRemoteKernel {
     }
   }
 
+  /**
+   * Report how much time concurrently fetching the piplite indices saved, once
+   * they have all been fetched, without waiting for them.
+   */
+  protected reportPrefetch(): void {
+    this._pyodide
+      .runPythonAsync(
+        `
+        import json
+        json.dumps(await piplite.piplite._PIPLITE_PREFETCH)
+      `,
+      )
+      .then((result: string) => {
+        const seconds = Object.values(JSON.parse(result) as Record<string, number>);
+        if (!seconds.length) {
+          return;
+        }
+        const serial = seconds.reduce((total, value) => total + value, 0);
+        const concurrent = Math.max(...seconds);
+        console.info(
+          `[piplite] prefetched ${seconds.length} indices in ${Math.round(
+            concurrent * 1000,
+          )}ms, saving ${Math.round((serial - concurrent) * 1000)}ms`,
+        );
+      })
+      .catch((err: any) => console.warn('[piplite] could not prefetch indices', err));
+  }
+
   protected async initGlobals(options: IPyodideWorkerKernel.IOptions): Promise<void> {
     const { globals } = this._pyodide;
     this._kernel = globals.get('pyodide_kernel').kernel_instance.copy();
@@ -129,11 +302,177 @@ export class PyodideRemoteKernel {
     }
   }
 
+  /**
+   * Mount an IndexedDB-backed site-packages, keeping installed packages across
+   * page loads, if enabled.
+   *
+   * The packages are only kept for the same Pyodide version, `pipliteUrls` (which
+   * include the hashes of the indices) and lock: otherwise, they are removed. Any
+   * files already in site-packages are copied over the persisted ones.
+   *
+   * As other kernels may share the same IndexedDB, a kernel only saves after it
+   * installs or loads packages, and adds what the others saved right before
+   * installing, without removing anything it has not saved yet.
+   */
+  protected async initSitePackages(
+    options: IPyodideWorkerKernel.IOptions,
+  ): Promise<void> {
+    if (!options.persistSitePackages) {
+      return;
+    }
+
+    const { FS } = this._pyodide;
+    const sitePackages: string = this._pyodide.runPython(
+      'import sysconfig; sysconfig.get_path("purelib")',
+    );
+    const stash = '/tmp/piplite-site-packages';
+    const version = JSON.stringify({
+      pyodide: this._pyodide.version,
+      pipliteUrls: options.pipliteUrls,
+      pipliteLockUrl: options.pipliteLockUrl || null,
+    });
+
+    let stashed = 0;
+    FS.mkdirTree(stash);
+    for (const name of FS.readdir(sitePackages)) {
+      if (name !== '.' && name !== '..') {
+        FS.rename(`${sitePackages}/${name}`, `${stash}/${name}`);
+        stashed++;
+      }
+    }
+
+    try {
+      FS.mount(FS.filesystems.IDBFS, {}, sitePackages);
+      await this.syncSitePackages(true);
+      this._sitePackages = sitePackages;
+    } catch (err) {
+      console.warn('Installed packages will NOT be kept across page loads', err);
+      try {
+        FS.unmount(sitePackages);
+      } catch {
+        // it was never mounted
+      }
+    }
+
+    const stale: boolean = await this._pyodide.runPythonAsync(`
+      import os, shutil
+
+      def _piplite_copy_site_packages(site_packages, stash, version):
+          marker = os.path.join(site_packages, "${SITE_PACKAGES_VERSION}")
+          try:
+              with open(marker) as f:
+                  stale = f.read() != version
+          except OSError:
+              stale = True
+          def remove(path):
+              if os.path.isdir(path) and not os.path.islink(path):
+                  shutil.rmtree(path)
+              elif os.path.lexists(path):
+                  os.remove(path)
+          if stale:
+              for name in os.listdir(site_packages):
+                  remove(os.path.join(site_packages, name))
+              with open(marker, "w") as f:
+                  f.write(version)
+          for name in os.listdir(stash):
+              path = os.path.join(site_packages, name)
+              remove(path)
+              shutil.move(os.path.join(stash, name), path)
+          os.rmdir(stash)
+          return stale
+
+      globals().pop("_piplite_copy_site_packages")(
+          *${JSON.stringify([sitePackages, stash, version])}
+      )
+    `);
+
+    // only save what this kernel changed, to keep what other kernels installed
+    if (stale || stashed) {
+      await this.persistSitePackages(true);
+    }
+  }
+
+  /**
+   * Copy a persisted site-packages between memory and IndexedDB.
+   *
+   * @param populate Whether to load from IndexedDB, rather than save to it
+   */
+  protected syncSitePackages(populate: boolean): Promise<void> {
+    return new Promise((resolve, reject) => {
+      this._pyodide.FS.syncfs(populate, (err: any) => (err ? reject(err) : resolve()));
+    });
+  }
+
+  /**
+   * Add the files of a persisted site-packages which are newer in IndexedDB, e.g.
+   * saved by another kernel, keeping any files only in memory.
+   *
+   * Unlike `syncfs`, nothing missing from IndexedDB is removed from memory, so
+   * changes which are not saved yet are kept.
+   */
+  protected mergeSitePackages(): Promise<void> {
+    const { FS } = this._pyodide;
+    const { IDBFS } = FS.filesystems;
+    const { mount } = FS.lookupPath(this._sitePackages).node;
+
+    return new Promise((resolve, reject) => {
+      IDBFS.getLocalSet(mount, (err: any, local: any) => {
+        if (err) {
+          return reject(err);
+        }
+        IDBFS.getRemoteSet(mount, (err: any, remote: any) => {
+          if (err) {
+            return reject(err);
+          }
+          // only reconcile what both have, so only remote files are added
+          const entries = Object.fromEntries(
+            Object.entries(local.entries).filter(([path]) => path in remote.entries),
+          );
+          IDBFS.reconcile(remote, { ...local, entries }, (err: any) =>
+            err ? reject(err) : resolve(),
+          );
+        });
+      });
+    });
+  }
+
+  /**
+   * Save a persisted site-packages, if `piplite` has installed, or Pyodide has
+   * loaded, any packages since the last time.
+   *
+   * @param force Whether to save, even if nothing has been installed
+   */
+  protected async persistSitePackages(force = false): Promise<void> {
+    if (!this._sitePackages) {
+      return;
+    }
+    const installs: number = this._pyodide.runPython(`
+      import sys
+      getattr(sys.modules.get("piplite.piplite"), "_PIPLITE_INSTALLS", 0)
+    `);
+    const loaded = Object.keys(this._pyodide.loadedPackages).length;
+    const changes = `${installs}:${loaded}`;
+    if (!force && changes === this._sitePackagesChanges) {
+      return;
+    }
+    this._sitePackagesChanges = changes;
+    try {
+      await this.syncSitePackages(false);
+    } catch (err) {
+      console.warn('Could not keep installed packages for later page loads', err);
+    }
+  }
+
   /**
    * Recursively convert a Map to a JavaScript object
    * @param obj A Map, Array, or other  object to convert
+   * @deprecated Use `formatResult`, which converts Python dicts to objects in the
+   * same pass as everything else
    */
   mapToObject(obj: any) {
+    if (obj instanceof this._pyodide.ffi.PyProxy) {
+      return this.formatResult(obj);
+    }
     const out: any = obj instanceof Array ? [] : {};
     obj.forEach((value: any, key: string) => {
       out[key] =
@@ -153,18 +492,93 @@ export class PyodideRemoteKernel {
     if (!(res instanceof this._pyodide.ffi.PyProxy)) {
       return res;
     }
-    // TODO: this is a bit brittle
-    const m = res.toJs();
-    const results = this.mapToObject(m);
-    return results;
+    // convert dicts to plain objects in the same pass as everything else
+    return res.toJs({ dict_converter: Object.fromEntries });
+  }
+
+  /**
+   * Format display data, which large bundles send as a single JSON string.
+   *
+   * @param data The display data from Python, as a proxy or a JSON string
+   */
+  formatData(data: any): any {
+    return typeof data === 'string' ? JSON.parse(data) : this.formatResult(data);
+  }
+
+  /**
+   * Copy Python buffers (e.g. `memoryview`s) once, to ArrayBuffers which can be
+   * transferred to the main thread without another copy.
+   *
+   * @param buffers A Python list of objects supporting the buffer protocol
+   */
+  formatBuffers(buffers: any): ArrayBuffer[] | undefined {
+    if (!(buffers instanceof this._pyodide.ffi.PyProxy)) {
+      return buffers;
+    }
+    const arrays: ArrayBuffer[] = [];
+    for (const buffer of buffers as any) {
+      const pyBuffer = buffer.getBuffer('u8');
+      try {
+        arrays.push(pyBuffer.data.slice().buffer);
+      } finally {
+        pyBuffer.release();
+        buffer.destroy();
+      }
+    }
+    return arrays;
+  }
+
+  /**
+   * Convert an incoming message for Python, with its buffers as `memoryview`s.
+   *
+   * @param msg A message which may have `buffers`
+   */
+  toPyMessage(msg: any): any {
+    const buffers = (msg?.buffers || []).map((buffer: ArrayBuffer | ArrayBufferView) =>
+      ArrayBuffer.isView(buffer)
+        ? new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength)
+        : new Uint8Array(buffer),
+    );
+    return this._pyodide.toPy({ ...msg, buffers });
   }
 
   /**
    * Makes sure pyodide is ready before continuing, and cache the parent message.
+   *
+   * The message is only converted to Python if the kernel asks for it.
    */
   async setup(parent: any): Promise<void> {
     await this._initialized;
-    this._kernel._parent_header = this._pyodide.toPy(parent);
+    this._kernel.set_parent(parent);
+    this._parentHeader = parent?.header;
+  }
+
+  /**
+   * Reset the kernel for a soft restart, keeping the runtime and installed packages.
+   */
+  async reset(): Promise<void> {
+    await this._initialized;
+    this._kernel.reset();
+    await this.chdir();
+  }
+
+  /**
+   * Move a kernel started ahead of time to its location, on the same drive.
+   *
+   * @param location The path of the kernel, without a drive name
+   */
+  async setLocation(location: string): Promise<void> {
+    await this._initialized;
+    this._localPath = location;
+    await this.chdir();
+  }
+
+  /**
+   * Get the size of the WebAssembly memory of the runtime, in bytes.
+   */
+  async getHeapSize(): Promise<number> {
+    await this._initialized;
+    return (this._pyodide as any)._module.HEAP8.buffer.byteLength;
   }
 
   /**
@@ -182,11 +596,11 @@ export class PyodideRemoteKernel {
     ): void => {
       const bundle = {
         execution_count: prompt_count,
-        data: this.formatResult(data),
+        data: this.formatData(data),
         metadata: this.formatResult(metadata),
       };
       postMessage({
-        parentHeader: this.formatResult(this._kernel._parent_header)['header'],
+        parentHeader: this._parentHeader,
         bundle,
         type: 'execute_result',
       });
@@ -199,7 +613,7 @@ export class PyodideRemoteKernel {
         traceback: traceback,
       };
       postMessage({
-        parentHeader: this.formatResult(this._kernel._parent_header)['header'],
+        parentHeader: this._parentHeader,
         bundle,
         type: 'execute_error',
       });
@@ -210,7 +624,7 @@ export class PyodideRemoteKernel {
         wait: this.formatResult(wait),
       };
       postMessage({
-        parentHeader: this.formatResult(this._kernel._parent_header)['header'],
+        parentHeader: this._parentHeader,
         bundle,
         type: 'clear_output',
       });
@@ -218,12 +632,12 @@ export class PyodideRemoteKernel {
 
     const displayDataCallback = (data: any, metadata: any, transient: any): void => {
       const bundle = {
-        data: this.formatResult(data),
+        data: this.formatData(data),
         metadata: this.formatResult(metadata),
         transient: this.formatResult(transient),
       };
       postMessage({
-        parentHeader: this.formatResult(this._kernel._parent_header)['header'],
+        parentHeader: this._parentHeader,
         bundle,
         type: 'display_data',
       });
@@ -235,12 +649,12 @@ export class PyodideRemoteKernel {
       transient: any,
     ): void => {
       const bundle = {
-        data: this.formatResult(data),
+        data: this.formatData(data),
         metadata: this.formatResult(metadata),
         transient: this.formatResult(transient),
       };
       postMessage({
-        parentHeader: this.formatResult(this._kernel._parent_header)['header'],
+        parentHeader: this._parentHeader,
         bundle,
         type: 'update_display_data',
       });
@@ -252,7 +666,7 @@ export class PyodideRemoteKernel {
         text: this.formatResult(text),
       };
       postMessage({
-        parentHeader: this.formatResult(this._kernel._parent_header)['header'],
+        parentHeader: this._parentHeader,
         bundle,
         type: 'stream',
       });
@@ -270,6 +684,7 @@ export class PyodideRemoteKernel {
 
     const res = await this._kernel.run(content.code);
     const results = this.formatResult(res);
+    await this.persistSitePackages();
 
     if (results['status'] === 'error') {
       publishExecutionError(results['ename'], results['evalue'], results['traceback']);
@@ -352,7 +767,7 @@ export class PyodideRemoteKernel {
     const res = this._kernel.comm_manager.comm_open(
       this._pyodide.toPy(null),
       this._pyodide.toPy(null),
-      this._pyodide.toPy(content),
+      this.toPyMessage(content),
     );
     const results = this.formatResult(res);
 
@@ -370,7 +785,7 @@ export class PyodideRemoteKernel {
     const res = this._kernel.comm_manager.comm_msg(
       this._pyodide.toPy(null),
       this._pyodide.toPy(null),
-      this._pyodide.toPy(content),
+      this.toPyMessage(content),
     );
     const results = this.formatResult(res);
 
@@ -388,7 +803,7 @@ export class PyodideRemoteKernel {
     const res = this._kernel.comm_manager.comm_close(
       this._pyodide.toPy(null),
       this._pyodide.toPy(null),
-      this._pyodide.toPy(content),
+      this.toPyMessage(content),
     );
     const results = this.formatResult(res);
 
@@ -419,7 +834,7 @@ export class PyodideRemoteKernel {
     };
     postMessage({
       type: 'input_request',
-      parentHeader: this.formatResult(this._kernel._parent_header)['header'],
+      parentHeader: this._parentHeader,
       content,
     });
   }
@@ -454,14 +869,18 @@ export class PyodideRemoteKernel {
    * @param buffers The binary buffers.
    */
   async sendComm(type: string, content: any, metadata: any, ident: any, buffers: any) {
-    postMessage({
-      type: type,
-      content: this.formatResult(content),
-      metadata: this.formatResult(metadata),
-      ident: this.formatResult(ident),
-      buffers: this.formatResult(buffers),
-      parentHeader: this.formatResult(this._kernel._parent_header)['header'],
-    });
+    const arrays = this.formatBuffers(buffers);
+    postMessage(
+      {
+        type: type,
+        content: this.formatResult(content),
+        metadata: this.formatResult(metadata),
+        ident: this.formatResult(ident),
+        buffers: arrays,
+        parentHeader: this._parentHeader,
+      },
+      { transfer: arrays || [] },
+    );
   }
 
   /**
@@ -486,4 +905,12 @@ export class PyodideRemoteKernel {
   protected _stderr_stream: any;
   protected _resolveInputReply: any;
   protected _driveFS: DriveFS | null = null;
+  protected _startupMetrics: IPyodideWorkerKernel.IStartupMetrics = {};
+  protected _wasmModule: IPyodideWorkerKernel.IWasmModule | null = null;
+  protected _sitePackages = '';
+  protected _sitePackagesChanges = '';
+  /**
+   * The header of the message being handled, as received from the main thread.
+   */
+  protected _parentHeader: any;
 }